@@ -0,0 +1,51 @@
+-- =====================================================
+-- ANOMALIAS PRÉ-CALCULADAS
+-- =====================================================
+
+-- Preenchida por scripts/anomalias.py (z-score por app, vetorizado).
+-- A view detecao_anomalias passa a ler desta tabela em vez de recalcular
+-- as estatísticas de Reviews a cada consulta. Guarda apenas as reviews
+-- relevantes (|score - média| > 1 ou z-score acima do limiar).
+
+CREATE TABLE IF NOT EXISTS anomalias (
+    id_review_sqlite INTEGER PRIMARY KEY,
+    id_app INTEGER,
+    score INTEGER,
+    media_app REAL,
+    desvio_app REAL,
+    diferenca_media REAL,
+    z_score REAL,
+    direcao VARCHAR(10),      -- Alto ou Baixo
+    anomalia_z BOOLEAN,       -- z_score acima do limiar usado no cálculo
+    FOREIGN KEY(id_review_sqlite) REFERENCES Reviews(id_review_sqlite),
+    FOREIGN KEY(id_app) REFERENCES Aplicativos(id_app)
+);
+
+CREATE INDEX IF NOT EXISTS idx_anomalias_diferenca ON anomalias(diferenca_media);
+
+DROP VIEW IF EXISTS detecao_anomalias;
+
+-- Mesmas colunas da versão original (mais z_score), agora sobre a tabela
+CREATE VIEW detecao_anomalias AS
+SELECT 
+    a.nome as app,
+    r.review_uuid,
+    an.score,
+    ROUND(an.media_app, 2) as media_app,
+    an.diferenca_media,
+    CASE 
+        WHEN an.diferenca_media > 2 THEN 'Anomalia'
+        WHEN an.diferenca_media > 1 THEN 'Variação Significativa'
+        ELSE 'Normal'
+    END as classificacao,
+    CASE 
+        WHEN an.score > an.media_app + 2 THEN 'Score Muito Alto'
+        WHEN an.score < an.media_app - 2 THEN 'Score Muito Baixo'
+        ELSE 'Score Normal'
+    END as tipo_anomalia,
+    ROUND(an.z_score, 2) as z_score
+FROM anomalias an
+JOIN Reviews r ON r.id_review_sqlite = an.id_review_sqlite
+JOIN Aplicativos a ON an.id_app = a.id_app
+WHERE an.diferenca_media > 1
+ORDER BY an.diferenca_media DESC;
@@ -0,0 +1,40 @@
+-- =====================================================
+-- CAPTURA DE MUDANÇAS (CDC) EM REVIEWS PARA SINCRONIZAR O MONGODB
+-- =====================================================
+
+-- Cada INSERT/UPDATE/DELETE em Reviews gera uma linha no changelog.
+-- O ETL incremental (etl_sqlite_to_mongodb.py --incremental) lê as
+-- linhas com seq acima da última sincronizada e envia ao MongoDB apenas
+-- o que mudou. Todos os comandos são idempotentes (IF NOT EXISTS).
+
+CREATE TABLE IF NOT EXISTS Reviews_Changelog (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_review_sqlite INTEGER NOT NULL,
+    operacao CHAR(1) NOT NULL,  -- I, U ou D
+    alterado_em TEXT DEFAULT (datetime('now'))
+);
+
+-- Última posição do changelog já aplicada em cada destino
+CREATE TABLE IF NOT EXISTS Sync_Estado (
+    destino TEXT PRIMARY KEY,
+    ultimo_seq INTEGER NOT NULL DEFAULT 0,
+    atualizado_em TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_cdc_insert
+AFTER INSERT ON Reviews
+BEGIN
+    INSERT INTO Reviews_Changelog (id_review_sqlite, operacao) VALUES (NEW.id_review_sqlite, 'I');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_cdc_update
+AFTER UPDATE ON Reviews
+BEGIN
+    INSERT INTO Reviews_Changelog (id_review_sqlite, operacao) VALUES (NEW.id_review_sqlite, 'U');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_reviews_cdc_delete
+AFTER DELETE ON Reviews
+BEGIN
+    INSERT INTO Reviews_Changelog (id_review_sqlite, operacao) VALUES (OLD.id_review_sqlite, 'D');
+END;
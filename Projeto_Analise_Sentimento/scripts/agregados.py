@@ -0,0 +1,384 @@
+"""
+Tabelas de agregados por aplicativo (visões materializadas).
+
+`resumo_app` guarda, por app, contagens, somas e contagens condicionais de
+Reviews; triggers em Reviews aplicam o delta de cada INSERT/UPDATE/DELETE,
+então a tabela fica sempre atual. `resumo_app_categoria` guarda contagem e
+soma de score por (app, categoria) de Reviews_Categorias JOIN Reviews, com
+triggers nas duas tabelas: categorias gravadas ou removidas, reviews que
+mudam de app ou de score e reviews apagadas (que levam junto suas linhas
+de Reviews_Categorias). A categoria de reviews novas é atribuída pelo motor
+de categorização (categorizacao.py), que reconstrói a tabela ao regravar
+Reviews_Categorias.
+
+As views `analise_qualidade_reviews`, `correlacao_metricas` e
+`analise_por_categorias` são recriadas sobre essas tabelas, com as mesmas
+colunas de melhorias_avaliacao.sql: as consultas dos dashboards passam a
+custar O(número de apps) em vez de O(número de reviews). A view
+`ranking_apps` promove a "Consulta 1" (RANK() OVER) de melhorias_avaliacao.sql,
+também sobre resumo_app; é ela que o BI lê, e o Gráfico 5 também quando ela
+cobre as mesmas reviews da base dos gráficos (todas com word_count).
+
+Todas as expressões saem de METRICAS, que alimenta a tabela, os triggers e a
+reconstrução completa (`python agregados.py`).
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+from instrumentacao import medido
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+
+# (coluna de resumo_app, contribuição de uma review; {r} é o alias/NEW/OLD)
+METRICAS = [
+    ('total_reviews', '1'),
+    ('soma_score', 'IFNULL({r}.score, 0)'),
+    ('n_score', '{r}.score IS NOT NULL'),
+    ('soma_palavras', 'IFNULL({r}.word_count, 0)'),
+    ('n_palavras', '{r}.word_count IS NOT NULL'),
+    ('soma_caracteres', 'IFNULL({r}.char_count, 0)'),
+    ('n_caracteres', '{r}.char_count IS NOT NULL'),
+    ('reviews_curtas', 'IFNULL({r}.word_count <= 5, 0)'),
+    ('reviews_medias', 'IFNULL({r}.word_count BETWEEN 6 AND 20, 0)'),
+    ('reviews_longas', 'IFNULL({r}.word_count > 20, 0)'),
+    ('reviews_com_ruido', 'IFNULL({r}.has_noise = 1, 0)'),
+    ('reviews_sem_ruido', 'IFNULL({r}.has_noise = 0, 0)'),
+    ('sentimentos_positivos', "IFNULL({r}.sentiment_label = 'positivo', 0)"),
+    ('sentimentos_negativos', "IFNULL({r}.sentiment_label = 'negativo', 0)"),
+    ('sentimentos_neutros', "IFNULL({r}.sentiment_label = 'neutro', 0)"),
+    ('soma_score_positivo', "CASE WHEN {r}.sentiment_label = 'positivo' THEN IFNULL({r}.score, 0) ELSE 0 END"),
+    ('n_score_positivo', "IFNULL({r}.sentiment_label = 'positivo' AND {r}.score IS NOT NULL, 0)"),
+    ('soma_score_negativo', "CASE WHEN {r}.sentiment_label = 'negativo' THEN IFNULL({r}.score, 0) ELSE 0 END"),
+    ('n_score_negativo', "IFNULL({r}.sentiment_label = 'negativo' AND {r}.score IS NOT NULL, 0)"),
+    ('soma_score_neutro', "CASE WHEN {r}.sentiment_label = 'neutro' THEN IFNULL({r}.score, 0) ELSE 0 END"),
+    ('n_score_neutro', "IFNULL({r}.sentiment_label = 'neutro' AND {r}.score IS NOT NULL, 0)"),
+    ('sentimentos_concordantes', 'IFNULL({r}.sentiment_label = {r}.model_sentiment, 0)'),
+    ('score_1', 'IFNULL({r}.score = 1, 0)'),
+    ('score_2', 'IFNULL({r}.score = 2, 0)'),
+    ('score_3', 'IFNULL({r}.score = 3, 0)'),
+    ('score_4', 'IFNULL({r}.score = 4, 0)'),
+    ('score_5', 'IFNULL({r}.score = 5, 0)'),
+]
+
+# Colunas de Reviews que afetam algum agregado (UPDATE OF ...)
+COLUNAS_OBSERVADAS = ['id_app', 'score', 'word_count', 'char_count', 'has_noise',
+                      'sentiment_label', 'model_sentiment']
+
+GATILHOS = ['trg_resumo_app_insert', 'trg_resumo_app_delete',
+            'trg_resumo_app_update_old', 'trg_resumo_app_update_new']
+GATILHOS_CATEGORIAS = ['trg_resumo_categoria_insert', 'trg_resumo_categoria_delete',
+                       'trg_resumo_categoria_update', 'trg_resumo_categoria_review_update',
+                       'trg_resumo_categoria_review_delete']
+
+SQL_TABELAS = f'''
+CREATE TABLE IF NOT EXISTS resumo_app (
+    id_app INTEGER PRIMARY KEY,
+    {', '.join(f'{coluna} INTEGER NOT NULL DEFAULT 0' for coluna, _ in METRICAS)},
+    FOREIGN KEY(id_app) REFERENCES Aplicativos(id_app)
+);
+
+CREATE TABLE IF NOT EXISTS resumo_app_categoria (
+    id_app INTEGER,
+    id_categoria INTEGER,
+    total_reviews INTEGER NOT NULL DEFAULT 0,
+    soma_score INTEGER NOT NULL DEFAULT 0,
+    n_score INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(id_app, id_categoria),
+    FOREIGN KEY(id_app) REFERENCES Aplicativos(id_app),
+    FOREIGN KEY(id_categoria) REFERENCES Categorias_Reviews(id_categoria)
+);
+'''
+
+
+def _atribuicoes(sinal, registro):
+    """SET coluna = coluna +/- contribuição, para todas as métricas"""
+    return ',\n        '.join(
+        f'{coluna} = {coluna} {sinal} ({expr.format(r=registro)})' for coluna, expr in METRICAS
+    )
+
+
+SQL_GATILHOS = f'''
+CREATE TRIGGER IF NOT EXISTS trg_resumo_app_insert
+AFTER INSERT ON Reviews
+WHEN NEW.id_app IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO resumo_app (id_app) VALUES (NEW.id_app);
+    UPDATE resumo_app SET
+        {_atribuicoes('+', 'NEW')}
+    WHERE id_app = NEW.id_app;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_app_delete
+AFTER DELETE ON Reviews
+WHEN OLD.id_app IS NOT NULL
+BEGIN
+    UPDATE resumo_app SET
+        {_atribuicoes('-', 'OLD')}
+    WHERE id_app = OLD.id_app;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_app_update_old
+AFTER UPDATE OF {', '.join(COLUNAS_OBSERVADAS)} ON Reviews
+WHEN OLD.id_app IS NOT NULL
+BEGIN
+    UPDATE resumo_app SET
+        {_atribuicoes('-', 'OLD')}
+    WHERE id_app = OLD.id_app;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_app_update_new
+AFTER UPDATE OF {', '.join(COLUNAS_OBSERVADAS)} ON Reviews
+WHEN NEW.id_app IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO resumo_app (id_app) VALUES (NEW.id_app);
+    UPDATE resumo_app SET
+        {_atribuicoes('+', 'NEW')}
+    WHERE id_app = NEW.id_app;
+END;
+'''
+
+def _delta_categoria(sinal, review, categoria):
+    """Soma (+) ou subtrai (-) a review `review` (id_review_sqlite) na linha (app dela, `categoria`)"""
+    r = f'(SELECT {{}} FROM Reviews WHERE id_review_sqlite = {review})'
+    insercao = '' if sinal == '-' else f'''
+    INSERT OR IGNORE INTO resumo_app_categoria (id_app, id_categoria)
+    SELECT id_app, {categoria} FROM Reviews WHERE id_review_sqlite = {review} AND id_app IS NOT NULL;'''
+    return insercao + f'''
+    UPDATE resumo_app_categoria SET
+        total_reviews = total_reviews {sinal} 1,
+        soma_score = soma_score {sinal} {r.format('IFNULL(score, 0)')},
+        n_score = n_score {sinal} {r.format('score IS NOT NULL')}
+    WHERE id_app = {r.format('id_app')} AND id_categoria = {categoria};'''
+
+
+def _move_review(sinal, registro):
+    """Soma (+) ou subtrai (-) os valores de NEW/OLD em todas as categorias da review"""
+    insercao = '' if sinal == '-' else f'''
+    INSERT OR IGNORE INTO resumo_app_categoria (id_app, id_categoria)
+    SELECT {registro}.id_app, id_categoria FROM Reviews_Categorias
+    WHERE id_review_sqlite = {registro}.id_review_sqlite AND {registro}.id_app IS NOT NULL;'''
+    return insercao + f'''
+    UPDATE resumo_app_categoria SET
+        total_reviews = total_reviews {sinal} 1,
+        soma_score = soma_score {sinal} IFNULL({registro}.score, 0),
+        n_score = n_score {sinal} ({registro}.score IS NOT NULL)
+    WHERE id_app = {registro}.id_app AND id_categoria IN (
+        SELECT id_categoria FROM Reviews_Categorias WHERE id_review_sqlite = {registro}.id_review_sqlite
+    );'''
+
+
+# resumo_app_categoria = Reviews_Categorias JOIN Reviews, mantida pelas duas pontas.
+# Só instalados quando Reviews_Categorias existe (melhorias_avaliacao.sql)
+SQL_GATILHOS_CATEGORIAS = f'''
+CREATE TRIGGER IF NOT EXISTS trg_resumo_categoria_insert
+AFTER INSERT ON Reviews_Categorias
+BEGIN{_delta_categoria('+', 'NEW.id_review_sqlite', 'NEW.id_categoria')}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_categoria_delete
+AFTER DELETE ON Reviews_Categorias
+BEGIN{_delta_categoria('-', 'OLD.id_review_sqlite', 'OLD.id_categoria')}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_categoria_update
+AFTER UPDATE OF id_review_sqlite, id_categoria ON Reviews_Categorias
+BEGIN{_delta_categoria('-', 'OLD.id_review_sqlite', 'OLD.id_categoria')}{_delta_categoria('+', 'NEW.id_review_sqlite', 'NEW.id_categoria')}
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_resumo_categoria_review_update
+AFTER UPDATE OF id_app, score ON Reviews
+BEGIN{_move_review('-', 'OLD')}{_move_review('+', 'NEW')}
+END;
+
+-- BEFORE: as linhas de Reviews_Categorias saem (e são subtraídas) enquanto a review existe
+CREATE TRIGGER IF NOT EXISTS trg_resumo_categoria_review_delete
+BEFORE DELETE ON Reviews
+BEGIN
+    DELETE FROM Reviews_Categorias WHERE id_review_sqlite = OLD.id_review_sqlite;
+END;
+'''
+
+# Ranking entre apps ("Consulta 1" de melhorias_avaliacao.sql). {fonte} é um SELECT
+# com app, total_reviews, media_score, media_palavras, pct_sem_ruido e pct_positivo
+SQL_RANKING = '''
+SELECT
+    app,
+    total_reviews,
+    ROUND(media_score, 2) as media_score,
+    ROUND(media_palavras, 1) as media_palavras,
+    ROUND(pct_sem_ruido, 2) as pct_sem_ruido,
+    ROUND(pct_positivo, 2) as pct_positivo,
+    RANK() OVER (ORDER BY media_score DESC) as rank_score,
+    RANK() OVER (ORDER BY media_palavras DESC) as rank_detalhamento,
+    RANK() OVER (ORDER BY pct_sem_ruido DESC) as rank_qualidade,
+    RANK() OVER (ORDER BY pct_positivo DESC) as rank_positivo,
+    RANK() OVER (ORDER BY total_reviews DESC) as rank_volume
+FROM ({fonte})
+ORDER BY rank_score, app
+'''
+
+# Mesmas colunas das views de melhorias_avaliacao.sql, lidas dos agregados
+SQL_VIEWS = '''
+DROP VIEW IF EXISTS analise_qualidade_reviews;
+CREATE VIEW analise_qualidade_reviews AS
+SELECT
+    a.nome as app,
+    ra.total_reviews,
+    ROUND(ra.soma_score * 1.0 / NULLIF(ra.n_score, 0), 2) as media_score,
+    ra.reviews_curtas,
+    ra.reviews_medias,
+    ra.reviews_longas,
+    ra.reviews_com_ruido,
+    ra.reviews_sem_ruido,
+    ra.sentimentos_positivos,
+    ra.sentimentos_negativos,
+    ra.sentimentos_neutros,
+    ROUND(ra.soma_score_positivo * 1.0 / NULLIF(ra.n_score_positivo, 0), 2) as media_score_positivo,
+    ROUND(ra.soma_score_negativo * 1.0 / NULLIF(ra.n_score_negativo, 0), 2) as media_score_negativo,
+    ROUND(ra.soma_score_neutro * 1.0 / NULLIF(ra.n_score_neutro, 0), 2) as media_score_neutro
+FROM resumo_app ra
+JOIN Aplicativos a ON ra.id_app = a.id_app
+WHERE ra.total_reviews > 0;
+
+DROP VIEW IF EXISTS correlacao_metricas;
+CREATE VIEW correlacao_metricas AS
+WITH estatisticas_app AS (
+    SELECT
+        a.nome as app,
+        ra.total_reviews,
+        ra.soma_score * 1.0 / NULLIF(ra.n_score, 0) as media_score,
+        ra.soma_palavras * 1.0 / NULLIF(ra.n_palavras, 0) as media_palavras,
+        ra.soma_caracteres * 1.0 / NULLIF(ra.n_caracteres, 0) as media_caracteres,
+        ra.reviews_sem_ruido * 100.0 / ra.total_reviews as pct_sem_ruido,
+        ra.sentimentos_positivos * 100.0 / ra.total_reviews as pct_positivo
+    FROM resumo_app ra
+    JOIN Aplicativos a ON ra.id_app = a.id_app
+    WHERE ra.total_reviews > 0
+)
+SELECT
+    app,
+    total_reviews,
+    ROUND(media_score, 2) as media_score,
+    ROUND(media_palavras, 1) as media_palavras,
+    ROUND(media_caracteres, 1) as media_caracteres,
+    ROUND(pct_sem_ruido, 2) as pct_sem_ruido,
+    ROUND(pct_positivo, 2) as pct_positivo,
+    CASE
+        WHEN media_palavras > 10 AND media_score > 4 THEN 'Alto Score + Reviews Detalhadas'
+        WHEN media_palavras <= 5 AND media_score <= 2 THEN 'Baixo Score + Reviews Curtas'
+        WHEN media_palavras > 10 AND media_score <= 2 THEN 'Baixo Score + Reviews Detalhadas (Críticas)'
+        WHEN media_palavras <= 5 AND media_score > 4 THEN 'Alto Score + Reviews Curtas (Simples)'
+        ELSE 'Padrão Misto'
+    END as perfil_correlacao
+FROM estatisticas_app;
+
+DROP VIEW IF EXISTS analise_por_categorias;
+CREATE VIEW analise_por_categorias AS
+SELECT
+    a.nome as app,
+    cr.nome_categoria,
+    rc.total_reviews as total_reviews_categoria,
+    ROUND(rc.soma_score * 1.0 / NULLIF(rc.n_score, 0), 2) as media_score_categoria,
+    ROUND(rc.total_reviews * 100.0 / ra.total_reviews, 2) as pct_categoria
+FROM resumo_app_categoria rc
+JOIN Aplicativos a ON rc.id_app = a.id_app
+JOIN Categorias_Reviews cr ON rc.id_categoria = cr.id_categoria
+JOIN resumo_app ra ON rc.id_app = ra.id_app
+WHERE rc.total_reviews > 0
+ORDER BY a.nome, total_reviews_categoria DESC;
+
+DROP VIEW IF EXISTS ranking_apps;
+CREATE VIEW ranking_apps AS
+''' + SQL_RANKING.format(fonte='''
+    SELECT
+        a.nome as app,
+        ra.total_reviews,
+        ra.soma_score * 1.0 / NULLIF(ra.n_score, 0) as media_score,
+        ra.soma_palavras * 1.0 / NULLIF(ra.n_palavras, 0) as media_palavras,
+        ra.reviews_sem_ruido * 100.0 / ra.total_reviews as pct_sem_ruido,
+        ra.sentimentos_positivos * 100.0 / ra.total_reviews as pct_positivo
+    FROM resumo_app ra
+    JOIN Aplicativos a ON ra.id_app = a.id_app
+    WHERE ra.total_reviews > 0
+''') + ';'
+
+
+def _existe_tabela(conn, nome):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nome,)).fetchone() is not None
+
+
+def instalar_agregados(conn):
+    """Cria tabelas, triggers e views sobre os agregados (idempotente)"""
+    gatilhos_categorias = SQL_GATILHOS_CATEGORIAS if _existe_tabela(conn, 'Reviews_Categorias') else ''
+    conn.executescript(SQL_TABELAS + SQL_GATILHOS + gatilhos_categorias + SQL_VIEWS)
+
+
+def agregados_instalados(conn):
+    """Indica se resumo_app existe no banco"""
+    return _existe_tabela(conn, 'resumo_app')
+
+
+def remover_gatilhos(conn, gatilhos=GATILHOS + GATILHOS_CATEGORIAS):
+    """Remove os triggers (cargas em lote); reconstruir_agregados os dispensa depois"""
+    for gatilho in gatilhos:
+        conn.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+    conn.commit()
+
+
+def reconstruir_agregados(conn):
+    """Depois de uma carga sem triggers: reinstala tudo e recalcula as duas tabelas"""
+    instalar_agregados(conn)
+    reconstruir_resumo_app(conn)
+    if _existe_tabela(conn, 'Reviews_Categorias'):
+        reconstruir_resumo_categorias(conn)
+
+
+@medido('resumo_app')
+def reconstruir_resumo_app(conn):
+    """Recalcula resumo_app inteira com um único GROUP BY sobre Reviews"""
+    colunas = ', '.join(coluna for coluna, _ in METRICAS)
+    somas = ', '.join(f'SUM({expr.format(r="r")})' for _, expr in METRICAS)
+    with conn:
+        conn.execute('DELETE FROM resumo_app')
+        conn.execute(f'''
+            INSERT INTO resumo_app (id_app, {colunas})
+            SELECT r.id_app, {somas}
+            FROM Reviews r
+            WHERE r.id_app IS NOT NULL
+            GROUP BY r.id_app
+        ''')
+
+
+@medido('resumo_app_categoria')
+def reconstruir_resumo_categorias(conn):
+    """Recalcula resumo_app_categoria a partir de Reviews_Categorias"""
+    with conn:
+        conn.execute('DELETE FROM resumo_app_categoria')
+        conn.execute('''
+            INSERT INTO resumo_app_categoria (id_app, id_categoria, total_reviews, soma_score, n_score)
+            SELECT r.id_app, rc.id_categoria, COUNT(*), SUM(IFNULL(r.score, 0)), COUNT(r.score)
+            FROM Reviews_Categorias rc
+            JOIN Reviews r ON r.id_review_sqlite = rc.id_review_sqlite
+            WHERE r.id_app IS NOT NULL
+            GROUP BY r.id_app, rc.id_categoria
+        ''')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cria e recalcula os agregados por aplicativo.')
+    parser.add_argument('--db', default=db_path, help='banco SQLite')
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    inicio = time.perf_counter()
+    reconstruir_agregados(conn)
+    conn.close()
+    print(f'Agregados por app recalculados em {time.perf_counter() - inicio:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Detecção de anomalias de score por aplicativo, vetorizada.
+
+Todas as estatísticas por app saem de `groupby(...).transform` em uma única
+passada: z-score, direção (Alto/Baixo) e a marcação de anomalia viram colunas,
+sem laço por app nem `iterrows`. Há dois métodos:
+- 'padrao': média e desvio padrão amostral (como o gráfico original);
+- 'robusto': mediana e MAD (escalado por 1.4826). Como os scores são discretos
+  (1 a 5), o MAD é zero com frequência; nesse caso usa-se o desvio absoluto
+  médio (escalado por 1.2533).
+
+`anomalias_por_contagem` faz o mesmo cálculo (método padrão) a partir de
+contagens por (app, score), para quem só tem os agregados (gráficos).
+
+`gravar_anomalias(conn)` grava o resultado na tabela `anomalias`
+(banco_de_dados_sqlite/anomalias.sql), lida pela view `detecao_anomalias`.
+A tabela é uma foto: a importação a regrava ao final de cada carga (se ela
+existir); qualquer outra mudança de score em Reviews pede uma nova execução
+de `python anomalias.py`.
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrumentacao import medido
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+anomalias_sql_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/anomalias.sql'))
+
+LIMIAR_Z = 1.5
+# A view original só considerava apps com mais de 10 reviews (todas, com ou sem score)
+MINIMO_REVIEWS = 11
+
+
+def detectar_anomalias(df, limiar=LIMIAR_Z, metodo='padrao', grupo='app', coluna='score'):
+    """Retorna um DataFrame (mesmo índice de df) com as estatísticas de anomalia"""
+    valores = df[coluna].astype(float)
+    por_grupo = valores.groupby(df[grupo], observed=True)
+
+    media = por_grupo.transform('mean')
+    if metodo == 'robusto':
+        centro = por_grupo.transform('median')
+        desvio_abs = (valores - centro).abs()
+        por_desvio = desvio_abs.groupby(df[grupo], observed=True)
+        escala = por_desvio.transform('median') * 1.4826
+        escala = escala.where(escala > 0, por_desvio.transform('mean') * 1.2533)
+    elif metodo == 'padrao':
+        centro = media
+        escala = por_grupo.transform('std')
+    else:
+        raise ValueError(f"Método de anomalia desconhecido: {metodo!r}")
+
+    diferenca = (valores - centro).abs()
+    # Desvio zero (ou app com uma review só): ninguém é anômalo
+    z_score = (diferenca / escala).where(escala > 0, 0.0).fillna(0.0)
+
+    return pd.DataFrame({
+        grupo: df[grupo],
+        coluna: df[coluna],
+        'media_app': media,
+        'desvio_app': escala,
+        'diferenca_media': (valores - media).abs(),
+        'z_score': z_score,
+        'tipo': np.where(valores > centro, 'Alto', 'Baixo'),
+        'anomalia': z_score > limiar,
+    }, index=df.index)
+
+
+def anomalias_por_contagem(contagens, limiar=LIMIAR_Z, grupo='app', coluna='score'):
+    """Z-score por (app, score) a partir de contagens; equivale a detectar_anomalias('padrao')"""
+    c = contagens['contagem'].astype(float)
+    x = contagens[coluna].astype(float)
+    chave = contagens[grupo]
+    n = c.groupby(chave, observed=True).transform('sum')
+    soma = (c * x).groupby(chave, observed=True).transform('sum')
+    soma_quadrados = (c * x * x).groupby(chave, observed=True).transform('sum')
+    media = soma / n
+    variancia = (soma_quadrados - n * media * media) / (n - 1)
+    desvio = np.sqrt(variancia.clip(lower=0)).where(n > 1)
+
+    diferenca = (x - media).abs()
+    z_score = (diferenca / desvio).where(desvio > 0, 0.0).fillna(0.0)
+    return pd.DataFrame({
+        grupo: chave,
+        coluna: contagens[coluna],
+        'contagem': contagens['contagem'],
+        'media_app': media,
+        'desvio_app': desvio,
+        'diferenca_media': diferenca,
+        'z_score': z_score,
+        'tipo': np.where(x > media, 'Alto', 'Baixo'),
+        'anomalia': z_score > limiar,
+    }, index=contagens.index)
+
+
+def anomalias_instaladas(conn):
+    """Indica se a tabela anomalias existe no banco"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'anomalias'"
+    ).fetchone() is not None
+
+
+def instalar_tabela(conn):
+    """Cria a tabela anomalias e recria a view detecao_anomalias sobre ela"""
+    with open(anomalias_sql_path, encoding='utf-8') as f:
+        conn.executescript(f.read())
+
+
+@medido('anomalias')
+def gravar_anomalias(conn, limiar=LIMIAR_Z, metodo='padrao', minimo_reviews=MINIMO_REVIEWS):
+    """Recalcula as anomalias de todas as reviews e regrava a tabela anomalias"""
+    instalar_tabela(conn)
+    df = pd.read_sql_query('SELECT id_review_sqlite, id_app, score FROM Reviews', conn)
+    # Mínimo sobre todas as reviews do app (COUNT(*) da view original); a média só sobre os scores
+    df = df[(df.groupby('id_app')['id_review_sqlite'].transform('size') >= minimo_reviews) & df['score'].notna()]
+    resultado = detectar_anomalias(df, limiar, metodo, grupo='id_app')
+    relevantes = resultado[(resultado['diferenca_media'] > 1) | resultado['anomalia']]
+
+    linhas = zip(
+        df.loc[relevantes.index, 'id_review_sqlite'].tolist(),
+        relevantes['id_app'].tolist(),
+        relevantes['score'].tolist(),
+        relevantes['media_app'].tolist(),
+        relevantes['desvio_app'].tolist(),
+        relevantes['diferenca_media'].tolist(),
+        relevantes['z_score'].tolist(),
+        relevantes['tipo'].tolist(),
+        relevantes['anomalia'].astype(int).tolist(),
+    )
+    with conn:
+        conn.execute('DELETE FROM anomalias')
+        conn.executemany('''
+            INSERT INTO anomalias (id_review_sqlite, id_app, score, media_app, desvio_app,
+                                   diferenca_media, z_score, direcao, anomalia_z)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', linhas)
+    return len(relevantes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Calcula as anomalias de score e grava a tabela anomalias.')
+    parser.add_argument('--db', default=db_path, help='banco SQLite')
+    parser.add_argument('--limiar', type=float, default=LIMIAR_Z, help='z-score a partir do qual é anomalia')
+    parser.add_argument('--metodo', default='padrao', choices=['padrao', 'robusto'],
+                        help='média/desvio padrão ou mediana/MAD')
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    inicio = time.perf_counter()
+    total = gravar_anomalias(conn, args.limiar, args.metodo)
+    conn.close()
+    print(f'{total} reviews gravadas em anomalias em {time.perf_counter() - inicio:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+"""
+Benchmark ponta a ponta do pipeline sobre dados sintéticos.
+
+Para cada tamanho pedido (ex.: `--tamanhos 10k 1M 10M`) as etapas rodam em
+sequência sobre um banco novo, em uma pasta temporária:
+
+    gerar -> importar -> agregados -> categorizacao -> anomalias -> views -> etl -> graficos
+
+Cada etapa roda em um processo próprio (spawn), então o pico de memória
+(ru_maxrss) medido é só dela; os módulos são importados antes do cronômetro.
+Com `--etapas`, as etapas anteriores necessárias também rodam, sem registro.
+
+São registrados tempo, linhas/s e pico de memória; o resultado vai para
+`benchmarks/historico.json` e é comparado com `benchmarks/baseline.json`
+(gravado com `--salvar-baseline`): etapas mais lentas ou mais pesadas que a
+baseline além da tolerância são marcadas como regressão e o script sai com
+código 1.
+
+Roda offline: o ETL usa `mongomock://` por padrão (`--mongo-uri` para um
+mongod local).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+import gerar_graficos_melhorias as graficos
+from agregados import instalar_agregados, reconstruir_resumo_app
+from anomalias import gravar_anomalias
+from categorizacao import gravar_categorias
+from dados_graficos import base_sqlite, carregar_agregados
+from etl_sqlite_to_mongodb import conectar_mongo, executar_etl
+from gerar_dados_sinteticos import escrever_csv, gerar_blocos
+from importar_csv_para_sqlite import importar
+from instrumentacao import etapa
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+banco_dir = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite'))
+benchmarks_path = os.path.abspath(os.path.join(script_dir, '../benchmarks'))
+
+TOLERANCIA = 0.20
+# Diferenças menores que isso são ruído de medição, não regressão
+MINIMO_SEGUNDOS = 0.05
+MINIMO_MB = 5
+SUFIXOS = {'k': 1_000, 'm': 1_000_000}
+
+
+def ler_tamanho(texto):
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500"""
+    texto = texto.strip().lower()
+    if texto[-1] in SUFIXOS:
+        return int(float(texto[:-1]) * SUFIXOS[texto[-1]])
+    return int(texto)
+
+
+def aplicar_script(conn, caminho):
+    """Executa um .sql comando a comando, ignorando os que falham (ex.: ALTER já aplicado)"""
+    comando = ''
+    with open(caminho, encoding='utf-8') as f:
+        for linha in f:
+            comando += linha
+            if sqlite3.complete_statement(comando):
+                try:
+                    conn.execute(comando)
+                except sqlite3.Error:
+                    pass
+                comando = ''
+    conn.commit()
+
+
+def preparar_banco(caminho_db):
+    """Banco novo com schema.sql + melhorias_avaliacao.sql (não medido)"""
+    conn = sqlite3.connect(caminho_db)
+    aplicar_script(conn, os.path.join(banco_dir, 'schema.sql'))
+    aplicar_script(conn, os.path.join(banco_dir, 'melhorias_avaliacao.sql'))
+    conn.close()
+
+
+# Etapas: cada uma recebe o contexto e roda no processo filho
+
+def etapa_gerar(ctx):
+    escrever_csv(gerar_blocos(ctx['linhas']), ctx['csv'])
+
+
+def etapa_importar(ctx):
+    importar(ctx['csv'], ctx['db'])
+
+
+def etapa_agregados(ctx):
+    conn = sqlite3.connect(ctx['db'])
+    instalar_agregados(conn)
+    reconstruir_resumo_app(conn)
+    conn.close()
+
+
+def etapa_categorizacao(ctx):
+    conn = sqlite3.connect(ctx['db'])
+    gravar_categorias(conn)
+    conn.close()
+
+
+def etapa_anomalias(ctx):
+    conn = sqlite3.connect(ctx['db'])
+    gravar_anomalias(conn)
+    conn.close()
+
+
+def etapa_views(ctx):
+    conn = sqlite3.connect(ctx['db'])
+    views = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'view' ORDER BY name")]
+    for view in views:
+        with etapa(f'view.{view}') as medida:
+            medida['linhas'] = len(conn.execute(f'SELECT * FROM {view}').fetchall())
+    conn.close()
+
+
+def etapa_etl(ctx):
+    client = conectar_mongo(ctx['mongo_uri'])
+    db = client['benchmark_analise_sentimento']
+    executar_etl(ctx['db'], db)
+    client.drop_database(db.name)
+    client.close()
+
+
+def etapa_graficos(ctx):
+    conn = sqlite3.connect(ctx['db'])
+    dados = carregar_agregados(conn, base_sqlite(conn))
+    conn.close()
+    graficos.PASTA_GRAFICOS = ctx['pasta']
+    for arquivo, (_, funcao, chaves) in graficos.GRAFICOS.items():
+        funcao({chave: dados[chave] for chave in chaves})
+
+
+ETAPAS = {
+    'gerar': etapa_gerar,
+    'importar': etapa_importar,
+    'agregados': etapa_agregados,
+    'categorizacao': etapa_categorizacao,
+    'anomalias': etapa_anomalias,
+    'views': etapa_views,
+    'etl': etapa_etl,
+    'graficos': etapa_graficos,
+}
+
+
+def executar_etapa(nome, ctx):
+    """Roda uma etapa (no processo filho) e devolve tempo e pico de memória"""
+    inicio = time.perf_counter()
+    ETAPAS[nome](ctx)
+    segundos = time.perf_counter() - inicio
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None
+    return {
+        'segundos': round(segundos, 3),
+        'linhas_por_segundo': round(ctx['linhas'] / segundos) if segundos > 0 else None,
+        'pico_mb': round(pico, 1) if pico is not None else None,
+    }
+
+
+def medir(linhas, etapas, mongo_uri, pasta_trabalho=None):
+    """Executa o pipeline até a última etapa pedida; retorna {etapa: medidas} das pedidas"""
+    pasta = tempfile.mkdtemp(prefix='benchmark_', dir=pasta_trabalho)
+    ctx = {
+        'linhas': linhas,
+        'pasta': pasta,
+        'csv': os.path.join(pasta, 'reviews.csv'),
+        'db': os.path.join(pasta, 'database.db'),
+        'mongo_uri': mongo_uri,
+    }
+    preparar_banco(ctx['db'])
+    contexto_mp = multiprocessing.get_context('spawn')
+    resultados = {}
+    try:
+        for nome in list(ETAPAS)[:max(list(ETAPAS).index(e) for e in etapas) + 1]:
+            with contexto_mp.Pool(1) as pool:
+                medidas = pool.apply(executar_etapa, (nome, ctx))
+            if nome not in etapas:
+                continue
+            resultados[nome] = medidas
+            print(f"  {nome:<14} {medidas['segundos']:>9.2f}s {medidas['linhas_por_segundo'] or 0:>12,} linhas/s "
+                  f"{medidas['pico_mb'] or 0:>8.0f} MB")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return resultados
+
+
+def versao_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=script_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ler_json(caminho, padrao):
+    if not os.path.exists(caminho):
+        return padrao
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def gravar_json(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f, indent=2, ensure_ascii=False)
+
+
+def regressoes(execucao, baseline, tolerancia=TOLERANCIA):
+    """Etapas piores que a baseline (mesmo número de linhas) além da tolerância"""
+    encontradas = []
+    for linhas, etapas in execucao['resultados'].items():
+        base = baseline.get('resultados', {}).get(linhas, {})
+        for nome, medidas in etapas.items():
+            anterior = base.get(nome)
+            if not anterior:
+                continue
+            for metrica, minimo in (('segundos', MINIMO_SEGUNDOS), ('pico_mb', MINIMO_MB)):
+                atual, referencia = medidas.get(metrica), anterior.get(metrica)
+                if atual is None or referencia is None:
+                    continue
+                if atual > referencia * (1 + tolerancia) and atual - referencia > minimo:
+                    encontradas.append(f'{linhas} linhas / {nome}: {metrica} {referencia} -> {atual} '
+                                       f'(+{(atual / referencia - 1) * 100:.0f}%)')
+    return encontradas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline sobre dados sintéticos.')
+    parser.add_argument('--tamanhos', nargs='+', default=['10k'], help='linhas por execução (10k, 1M, 10M...)')
+    parser.add_argument('--etapas', nargs='+', default=list(ETAPAS), choices=list(ETAPAS),
+                        help='etapas medidas (na ordem do pipeline)')
+    parser.add_argument('--mongo-uri', default='mongomock://', help='MongoDB do ETL')
+    parser.add_argument('--pasta', default=benchmarks_path, help='pasta do histórico e da baseline')
+    parser.add_argument('--pasta-trabalho', default=None, help='onde criar os dados temporários')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA, help='piora aceita antes de regressão')
+    parser.add_argument('--salvar-baseline', action='store_true', help='grava esta execução como baseline')
+    args = parser.parse_args(argv)
+
+    etapas = [nome for nome in ETAPAS if nome in args.etapas]
+    execucao = {
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'versao': versao_codigo(),
+        'resultados': {},
+    }
+    for tamanho in args.tamanhos:
+        linhas = ler_tamanho(tamanho)
+        print(f'{linhas:,} linhas:')
+        execucao['resultados'][str(linhas)] = medir(linhas, etapas, args.mongo_uri, args.pasta_trabalho)
+
+    historico_path = os.path.join(args.pasta, 'historico.json')
+    baseline_path = os.path.join(args.pasta, 'baseline.json')
+    historico = ler_json(historico_path, [])
+    historico.append(execucao)
+    gravar_json(historico_path, historico)
+
+    encontradas = regressoes(execucao, ler_json(baseline_path, {}), args.tolerancia)
+    if args.salvar_baseline:
+        gravar_json(baseline_path, execucao)
+        print(f'Baseline gravada em {baseline_path}')
+    for regressao in encontradas:
+        print(f'REGRESSÃO: {regressao}')
+    return 1 if encontradas else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+"""
+Motor único de categorização das reviews.
+
+As regras vêm de `Categorias_Reviews.criterios` (mesmas 8 categorias de
+melhorias_avaliacao.sql) e são avaliadas em ordem de prioridade: cada review
+recebe a primeira categoria cujo critério é verdadeiro; quem não casa com
+nenhum critério fica com a última categoria ('Reviews Balanceadas'), como no
+`else` da categorização original dos gráficos, com confiança menor.
+
+Dois caminhos, sempre com as mesmas regras:
+- `categorizar(df)`: máscaras vetorizadas (DataFrame.eval + np.select), para
+  os DataFrames dos gráficos e os dados simulados;
+- `gravar_categorias(conn)`: um único INSERT ... SELECT CASE no SQLite, que
+  preenche `Reviews_Categorias` (e, se instalados, os agregados por categoria
+  lidos pela view `analise_por_categorias`).
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from agregados import (GATILHOS_CATEGORIAS, agregados_instalados, instalar_agregados,
+                       reconstruir_resumo_categorias, remover_gatilhos)
+from instrumentacao import medido
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+
+# Confiança gravada em Reviews_Categorias
+CONFIANCA_CRITERIO = 1.0   # a review satisfaz o critério da categoria
+CONFIANCA_PADRAO = 0.5     # nenhuma regra casou: categoria padrão (última)
+
+# (id_categoria, nome_categoria, criterios) - espelho do INSERT de melhorias_avaliacao.sql,
+# usado quando não há banco (dados simulados)
+REGRAS_PADRAO = [
+    (1, 'Reviews Detalhadas Positivas', 'word_count > 10 AND sentiment_label = "positivo"'),
+    (2, 'Reviews Críticas Detalhadas', 'word_count > 10 AND sentiment_label = "negativo"'),
+    (3, 'Reviews Simples Positivas', 'word_count <= 5 AND sentiment_label = "positivo"'),
+    (4, 'Reviews com Ruído', 'has_noise = 1'),
+    (5, 'Reviews de Alta Qualidade', 'has_noise = 0 AND word_count > 10'),
+    (6, 'Reviews Neutras Detalhadas', 'word_count > 10 AND sentiment_label = "neutro"'),
+    (7, 'Reviews Extremas', 'score = 1 OR score = 5'),
+    (8, 'Reviews Balanceadas', 'score BETWEEN 3 AND 4'),
+]
+
+
+def carregar_regras(conn):
+    """Lê as regras de Categorias_Reviews em ordem de prioridade (id_categoria)"""
+    return conn.execute(
+        'SELECT id_categoria, nome_categoria, criterios FROM Categorias_Reviews ORDER BY id_categoria'
+    ).fetchall()
+
+
+def criterio_para_sql(criterio):
+    """Normaliza o critério para SQL padrão (strings entre aspas simples)"""
+    return re.sub(r'"([^"]*)"', r"'\1'", criterio)
+
+
+def criterio_para_pandas(criterio):
+    """Traduz o critério SQL para a sintaxe de DataFrame.eval"""
+    expr = criterio_para_sql(criterio)
+    expr = re.sub(r'(\w+)\s+BETWEEN\s+(\S+)\s+AND\s+(\S+)', r'(\1 >= \2 and \1 <= \3)', expr,
+                  flags=re.IGNORECASE)
+    expr = re.sub(r'\bAND\b', 'and', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'\bOR\b', 'or', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'\bNOT\b', 'not', expr, flags=re.IGNORECASE)
+    expr = re.sub(r'(?<![<>!=])=(?!=)', '==', expr)
+    return expr.replace('<>', '!=')
+
+
+def categorizar(df, regras=None):
+    """Retorna (categoria, confianca) de cada linha em uma passada vetorizada"""
+    regras = regras or REGRAS_PADRAO
+    mascaras = [df.eval(criterio_para_pandas(criterio)).fillna(False).to_numpy(dtype=bool)
+                for _, _, criterio in regras]
+    nomes = [nome for _, nome, _ in regras]
+    categoria = np.select(mascaras, nomes, default=nomes[-1])
+    casou = np.logical_or.reduce(mascaras) if mascaras else np.zeros(len(df), dtype=bool)
+    confianca = np.where(casou, CONFIANCA_CRITERIO, CONFIANCA_PADRAO)
+    return (pd.Series(categoria, index=df.index, name='categoria'),
+            pd.Series(confianca, index=df.index, name='confianca'))
+
+
+def sql_case_categoria(regras, valor='id'):
+    """Expressão CASE da categoria (id_categoria ou, com valor='nome', nome_categoria)"""
+    def literal(regra):
+        return str(regra[0]) if valor == 'id' else "'" + regra[1].replace("'", "''") + "'"
+    casos = '\n'.join(f'                WHEN ({criterio_para_sql(regra[2])}) THEN {literal(regra)}'
+                      for regra in regras)
+    return f'''CASE
+{casos}
+                ELSE {literal(regras[-1])}
+            END'''
+
+
+def sql_categorizacao(regras):
+    """SELECT que devolve (id_review_sqlite, id_categoria, confianca) em uma passada"""
+    condicoes = ' OR '.join(f'({criterio_para_sql(criterio)})' for _, _, criterio in regras)
+    return f'''
+        SELECT
+            id_review_sqlite,
+            {sql_case_categoria(regras)} AS id_categoria,
+            CASE WHEN {condicoes} THEN {CONFIANCA_CRITERIO} ELSE {CONFIANCA_PADRAO} END AS confianca
+        FROM Reviews
+    '''
+
+
+@medido('categorizacao')
+def gravar_categorias(conn, regras=None):
+    """Recalcula Reviews_Categorias inteira com um único INSERT ... SELECT"""
+    regras = regras or carregar_regras(conn)
+    gatilhos = agregados_instalados(conn)
+    if gatilhos:
+        # Regravação inteira: um GROUP BY no final em vez dos triggers linha a linha
+        remover_gatilhos(conn, GATILHOS_CATEGORIAS)
+    with conn:
+        conn.execute('DELETE FROM Reviews_Categorias')
+        total = conn.execute(
+            'INSERT INTO Reviews_Categorias (id_review_sqlite, id_categoria, confianca)' + sql_categorizacao(regras)
+        ).rowcount
+    if gatilhos:
+        instalar_agregados(conn)
+        reconstruir_resumo_categorias(conn)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Categoriza as reviews e grava Reviews_Categorias.')
+    parser.add_argument('--db', default=db_path, help='banco SQLite')
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    inicio = time.perf_counter()
+    total = gravar_categorias(conn)
+    conn.close()
+    print(f'{total} reviews categorizadas em {time.perf_counter() - inicio:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Camada de dados dos gráficos: agregar primeiro, desenhar depois.
+
+Um único GROUP BY no SQLite conta as reviews por célula (app, score,
+sentimento, categoria, ruído, word_count) e só essas células chegam ao
+pandas, onde cada agregado dos gráficos é uma soma sobre elas. A base
+(JOINs e CASE da categoria) é varrida uma vez para os agregados e uma vez
+para a amostra de linhas do box plot; o resto depende do número de
+células, não do tamanho de Reviews.
+
+Os dados simulados e o snapshot Parquet (snapshot_parquet.py) já estão em
+um DataFrame (categórico, ver `tipar`): as mesmas células saem de um
+groupby em pandas, sem copiar as linhas para um banco, e passam pelos
+mesmos agregados.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from categorizacao import REGRAS_PADRAO, carregar_regras, categorizar, sql_case_categoria
+from instrumentacao import etapa, medido
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+snapshot_path = os.path.abspath(os.path.join(script_dir, '../dados_exportados_parquet/reviews'))
+
+TAMANHO_AMOSTRA = 20_000
+# Faixas de word_count no histograma 2D palavras x score (gráfico 2)
+BINS_PALAVRAS = 60
+
+# Mesmas faixas de pd.cut(word_count, bins=[0, 5, 10, 20, 100])
+TAMANHOS = ['Muito Curta (≤5)', 'Curta (6-10)', 'Média (11-20)', 'Longa (>20)']
+
+
+# Esquema compacto dos DataFrames de reviews: rótulos como category, has_noise
+# como bool e inteiros no menor tipo que comporta os valores (int8/int16/...)
+COLUNAS_CATEGORICAS = ['app', 'sentiment_label', 'model_sentiment', 'categoria']
+COLUNAS_BOOLEANAS = ['has_noise']
+
+
+def tipar(df):
+    """Converte um DataFrame de reviews para o esquema compacto (sem alterar o original)"""
+    tipos = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if coluna in COLUNAS_CATEGORICAS:
+            tipos[coluna] = 'category'
+        elif coluna in COLUNAS_BOOLEANAS and not serie.isna().any():
+            tipos[coluna] = bool
+        elif pd.api.types.is_integer_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype):
+            tipos[coluna] = pd.to_numeric(serie, downcast='integer').dtype
+    return df.astype(tipos)
+
+
+def reta_minimos_quadrados(n, soma_x, soma_y, soma_xx, soma_xy):
+    """(inclinação, intercepto) da reta de mínimos quadrados a partir das somas acumuladas
+
+    As somas são aditivas: podem vir de um único SELECT SUM(...) ou ser
+    acumuladas bloco a bloco, sem guardar os pontos.
+    """
+    denominador = n * soma_xx - soma_x * soma_x
+    if not n or denominador == 0:
+        return None
+    inclinacao = (n * soma_xy - soma_x * soma_y) / denominador
+    return inclinacao, (soma_y - inclinacao * soma_x) / n
+
+
+def _existe(conn, nome):
+    return conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (nome,)).fetchone() is not None
+
+
+def base_sqlite(conn):
+    """SELECT das reviews usadas nos gráficos, com a categoria de cada uma"""
+    regras = carregar_regras(conn) if _existe(conn, 'Categorias_Reviews') else REGRAS_PADRAO
+    categorias_gravadas = _existe(conn, 'Reviews_Categorias') and \
+        conn.execute('SELECT 1 FROM Reviews_Categorias LIMIT 1').fetchone() is not None
+    if categorias_gravadas:
+        # Rótulos já calculados pelo motor de categorização
+        categoria = 'cr.nome_categoria'
+        juncao = '''
+            LEFT JOIN Reviews_Categorias rc ON rc.id_review_sqlite = r.id_review_sqlite
+            LEFT JOIN Categorias_Reviews cr ON cr.id_categoria = rc.id_categoria'''
+    else:
+        categoria = sql_case_categoria(regras, valor='nome')
+        juncao = ''
+    return f'''
+        SELECT r.id_review_sqlite as id_review, a.nome as app, r.score, r.word_count, r.char_count,
+               r.has_noise, r.sentiment_label, r.model_sentiment,
+               {categoria} as categoria
+        FROM Reviews r
+        JOIN Aplicativos a ON r.id_app = a.id_app
+        {juncao}
+        WHERE r.word_count IS NOT NULL
+    '''
+
+
+def base_dataframe(df, manter_categoria=False):
+    """DataFrame de reviews com as colunas da base: id_review e categoria
+
+    Sem `manter_categoria` a categoria é recalculada com as regras padrão; sem
+    coluna id_review, a posição da linha (a partir de 1) faz esse papel.
+    """
+    extras = {}
+    if 'id_review' not in df.columns:
+        extras['id_review'] = np.arange(1, len(df) + 1)
+    if not manter_categoria or 'categoria' not in df.columns:
+        extras['categoria'] = categorizar(df)[0].astype('category')
+    return df.assign(**extras)
+
+
+# Grão mais fino usado pelos gráficos: todo agregado é uma soma sobre estas células
+CHAVES_CELULA = ['app', 'score', 'sentiment_label', 'categoria', 'has_noise', 'word_count']
+
+# Colunas da base lidas pelos agregados dos gráficos
+COLUNAS_GRAFICOS = ['id_review', 'app', 'score', 'word_count', 'has_noise', 'sentiment_label', 'categoria']
+
+
+def ler_snapshot(caminho=snapshot_path, colunas=None):
+    """Lê o snapshot Parquet com memory-map, só com as colunas pedidas"""
+    import pyarrow.parquet as pq
+
+    tabela = pq.read_table(caminho, columns=colunas, memory_map=True, partitioning='hive')
+    return tipar(tabela.to_pandas())
+
+
+def base_parquet(caminho=snapshot_path):
+    """Base dos gráficos (DataFrame) a partir do snapshot Parquet"""
+    return base_dataframe(ler_snapshot(caminho, COLUNAS_GRAFICOS), manter_categoria=True)
+
+
+def _consulta(conn, base, nome, sql, params=()):
+    with etapa(f'consulta.{nome}', perfil=False) as medida:
+        resultado = pd.read_sql_query(f'WITH base AS ({base}) {sql}', conn, params=params)
+        medida['linhas'] = len(resultado)
+    return resultado
+
+
+def celulas_sqlite(conn, base):
+    """Contagem de reviews por célula (CHAVES_CELULA) em um único GROUP BY sobre a base"""
+    chaves = ', '.join(CHAVES_CELULA)
+    return _consulta(conn, base, 'celulas', f'''
+        SELECT {chaves}, COUNT(*) as contagem
+        FROM base
+        GROUP BY {chaves}
+    ''')
+
+
+def celulas_dataframe(df):
+    """Contagem de reviews por célula (CHAVES_CELULA) em um groupby sobre o DataFrame base"""
+    with etapa('consulta.celulas', perfil=False) as medida:
+        base = df.loc[df['word_count'].notna(), CHAVES_CELULA]
+        celulas = base.groupby(CHAVES_CELULA, observed=True, dropna=False).size().reset_index(name='contagem')
+        # Mesmos tipos das células lidas do SQLite (inteiros int64, has_noise 0/1)
+        celulas['has_noise'] = celulas['has_noise'].astype(float if celulas['has_noise'].isna().any() else int)
+        for coluna in ['score', 'word_count']:
+            celulas[coluna] = celulas[coluna].astype(float if celulas[coluna].isna().any() else 'int64')
+        medida['linhas'] = len(celulas)
+    return celulas
+
+
+def ranking_por_app(por_app):
+    """Mesmas colunas e posições de agregados.SQL_RANKING (RANK() OVER), a partir de por_app"""
+    ranking = pd.DataFrame({
+        'total_reviews': por_app['total_reviews'],
+        'media_score': por_app['media_score'].round(2),
+        'media_palavras': por_app['media_palavras'].round(1),
+        'pct_sem_ruido': por_app['pct_sem_ruido'].round(2),
+        'pct_positivo': por_app['pct_positivo'].round(2),
+    })
+    for coluna, metrica in [('rank_score', 'media_score'), ('rank_detalhamento', 'media_palavras'),
+                            ('rank_qualidade', 'pct_sem_ruido'), ('rank_positivo', 'pct_positivo'),
+                            ('rank_volume', 'total_reviews')]:
+        ranking[coluna] = por_app[metrica].rank(method='min', ascending=False, na_option='bottom').astype(int)
+    return ranking.sort_values(['rank_score', 'app'])
+
+
+def agregar_celulas(celulas):
+    """Agregados dos gráficos (exceto a amostra) somando as células em pandas"""
+    # Rótulos como object: grupos na ordem alfabética e nulos preservados (dropna=False)
+    cel = celulas.astype({c: object for c in ['app', 'sentiment_label', 'categoria']})
+    c = cel['contagem']
+    tem_score = cel['score'].notna()
+    cel = cel.assign(
+        n_score=c.where(tem_score, 0),
+        soma_score=(cel['score'].fillna(0) * c),
+        soma_palavras=cel['word_count'] * c,
+        sem_ruido=c.where(cel['has_noise'] == 0, 0),
+        positivos=c.where(cel['sentiment_label'] == 'positivo', 0),
+    )
+    dados = {}
+
+    # Métricas por app (gráficos 1 e 5)
+    g = cel.groupby('app')[['contagem', 'n_score', 'soma_score', 'soma_palavras', 'sem_ruido', 'positivos']].sum()
+    dados['por_app'] = pd.DataFrame({
+        'total_reviews': g['contagem'],
+        'media_score': g['soma_score'] / g['n_score'].where(g['n_score'] > 0),
+        'media_palavras': g['soma_palavras'] / g['contagem'],
+        'pct_sem_ruido': g['sem_ruido'] * 100.0 / g['contagem'],
+        'pct_positivo': g['positivos'] * 100.0 / g['contagem'],
+    })
+    dados['ranking'] = ranking_por_app(dados['por_app'])
+
+    dados['app_sentimento'] = (cel.groupby(['app', 'sentiment_label'], dropna=False)['contagem']
+                               .sum().reset_index())
+
+    # Distribuição de scores por app (gráfico 4)
+    com_score = cel[tem_score].astype({'score': int})
+    dados['app_score'] = com_score.groupby(['app', 'score'])['contagem'].sum().reset_index()
+
+    # Faixas de tamanho (gráfico 2)
+    cel['tamanho_categoria'] = pd.cut(cel['word_count'], bins=[0, 5, 10, 20, 100], labels=TAMANHOS)
+    dados['tamanho'] = (cel.groupby(['app', 'tamanho_categoria', 'sentiment_label'], dropna=False, observed=True)
+                        [['contagem', 'soma_score', 'n_score']].sum().reset_index()
+                        .dropna(subset=['tamanho_categoria']).reset_index(drop=True))
+
+    # Categorias (gráfico 3)
+    dados['categoria'] = (cel.groupby(['app', 'categoria'], dropna=False)
+                          [['contagem', 'soma_score', 'n_score', 'sem_ruido', 'soma_palavras']]
+                          .sum().reset_index())
+
+    # Palavras x score (gráfico 2): somas da regressão e histograma 2D.
+    # O custo de desenho depende do número de bins, não do número de reviews.
+    x, y, n = com_score['word_count'], com_score['score'], com_score['contagem']
+    regressao = {
+        'n': n.sum(), 'soma_x': (x * n).sum(), 'soma_y': (y * n).sum(),
+        'soma_xx': (x * x * n).sum(), 'soma_xy': (x * y * n).sum(),
+        'max_palavras': x.max() if len(x) else 0,
+    }
+    dados['regressao'] = pd.DataFrame([regressao])
+    largura = max(1, -(-int(regressao['max_palavras']) // BINS_PALAVRAS))
+    densidade = com_score.assign(bin_palavras=(x // largura) * largura)
+    densidade = densidade.groupby(['bin_palavras', 'score'])['contagem'].sum().reset_index()
+    densidade.insert(1, 'largura_bin', largura)
+    dados['densidade'] = densidade
+
+    return dados
+
+
+def passo_amostra(dados, tamanho_amostra=TAMANHO_AMOSTRA):
+    """Intervalo entre ids da amostra do box plot (cerca de `tamanho_amostra` linhas)"""
+    total = int(dados['por_app']['total_reviews'].sum())
+    return max(1, -(-total // tamanho_amostra))
+
+
+@medido('agregados_graficos')
+def carregar_agregados(conn, base, tamanho_amostra=TAMANHO_AMOSTRA):
+    """Uma passada de GROUP BY no SQLite; os agregados de cada gráfico saem das células"""
+    dados = agregar_celulas(celulas_sqlite(conn, base))
+
+    # Ranking entre apps (gráfico 5): a view ranking_apps, sobre os agregados mantidos
+    # por trigger, quando existir. resumo_app conta todas as reviews e a base só as com
+    # word_count: a view só vale se as contagens por app coincidirem (mesma população)
+    if _existe(conn, 'ranking_apps'):
+        with etapa('consulta.ranking_apps', perfil=False):
+            ranking = pd.read_sql_query('SELECT * FROM ranking_apps', conn).set_index('app')
+        if ranking['total_reviews'].to_dict() == dados['por_app']['total_reviews'].to_dict():
+            dados['ranking'] = ranking
+
+    # Amostra de linhas para o box plot: uma a cada `passo` ids, sem ordenar
+    # a tabela e determinística (a mesma base gera a mesma amostra e o mesmo gráfico)
+    dados['amostra'] = tipar(_consulta(conn, base, 'amostra', '''
+        SELECT app, word_count, score
+        FROM base
+        WHERE score IS NOT NULL AND id_review % ? = 0
+    ''', (passo_amostra(dados, tamanho_amostra),)))
+
+    return dados
+
+
+@medido('agregados_graficos')
+def carregar_agregados_dataframe(df, tamanho_amostra=TAMANHO_AMOSTRA):
+    """Os agregados de carregar_agregados a partir do DataFrame base (base_dataframe/base_parquet)"""
+    dados = agregar_celulas(celulas_dataframe(df))
+
+    # Mesma amostra determinística do SQLite: ids múltiplos do passo
+    passo = passo_amostra(dados, tamanho_amostra)
+    with etapa('consulta.amostra', perfil=False) as medida:
+        filtro = df['word_count'].notna() & df['score'].notna() & (df['id_review'] % passo == 0)
+        # Na ordem de id_review (a do SQLite, não a das partições) e, sem nulos, com score e
+        # word_count inteiros: o mesmo frame (e a mesma impressão digital) da amostra do SQLite.
+        # app volta a object para tipar só com as categorias presentes na amostra
+        amostra = (df.loc[filtro, ['id_review', 'app', 'word_count', 'score']].sort_values('id_review')
+                   .drop(columns='id_review').reset_index(drop=True)
+                   .astype({'app': object, 'word_count': 'int64', 'score': 'int64'}))
+        dados['amostra'] = tipar(amostra)
+        medida['linhas'] = len(amostra)
+
+    return dados
@@ -0,0 +1,178 @@
+"""
+Tabelas de dimensão (Aplicativos, Categorias_Reviews) em memória.
+
+Cada dimensão é um mapa nome <-> id carregado uma vez por processo e
+compartilhado pelo importador, pelo gerador sintético e pelo ETL:
+
+    apps = dimensao(conn, 'apps')
+    apps.resolver(conn, bloco['app'].unique())   # nomes novos: um INSERT em lote
+    bloco['app'].map(apps.ids)
+
+Os nomes são internados (`sys.intern`), então as strings repetidas nos
+blocos apontam para o mesmo objeto. A validade do mapa é conferida pela
+versão da tabela em `Versao_Dimensoes`, que triggers incrementam a cada
+INSERT, UPDATE ou DELETE (renomear um app muda a versão mesmo com o nome do
+mesmo tamanho): se não mudou, vale o mapa já em memória ou o cache em disco
+`<banco>.dimensoes.json`; senão a tabela é relida e o cache regravado. Numa
+conexão que não pode criar os triggers (somente leitura), a assinatura é um
+hash dos pares (id, nome) em ordem.
+
+O mapa em memória é compartilhado por caminho do banco; bancos em memória
+(`:memory:`) não têm caminho e cada chamada carrega o seu.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+
+# nome -> (tabela, coluna do id, coluna do nome)
+DIMENSOES = {
+    'apps': ('Aplicativos', 'id_app', 'nome'),
+    'categorias': ('Categorias_Reviews', 'id_categoria', 'nome_categoria'),
+}
+
+SQL_VERSAO = '''
+CREATE TABLE IF NOT EXISTS Versao_Dimensoes (
+    tabela TEXT PRIMARY KEY,
+    versao INTEGER NOT NULL
+)
+'''
+
+_carregadas = {}
+
+
+class Dimensao:
+    """Mapa nome <-> id de uma tabela de dimensão"""
+
+    def __init__(self, tabela, coluna_id, coluna_nome):
+        self.tabela = tabela
+        self.coluna_id = coluna_id
+        self.coluna_nome = coluna_nome
+        self.ids = {}      # nome -> id
+        self.nomes = {}    # id -> nome
+        self.assinatura = None
+
+    def _pares(self, conn):
+        return conn.execute(
+            f'SELECT {self.coluna_id}, {self.coluna_nome} FROM {self.tabela} ORDER BY {self.coluna_id}'
+        ).fetchall()
+
+    def _versao(self, conn):
+        try:
+            row = conn.execute('SELECT versao FROM Versao_Dimensoes WHERE tabela = ?', (self.tabela,)).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        return row[0] if row else None
+
+    def instalar_versao(self, conn):
+        """Cria a versão da tabela e os triggers que a incrementam (idempotente)"""
+        conn.execute(SQL_VERSAO)
+        # Começa em um valor aleatório: um banco recriado no mesmo caminho não
+        # reaproveita por acaso a versão gravada no cache em disco do anterior
+        conn.execute('INSERT OR IGNORE INTO Versao_Dimensoes (tabela, versao) VALUES (?, ABS(RANDOM() % 1000000000))',
+                     (self.tabela,))
+        for evento in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_versao_{self.tabela}_{evento.lower()}
+                AFTER {evento} ON {self.tabela}
+                BEGIN
+                    UPDATE Versao_Dimensoes SET versao = versao + 1 WHERE tabela = '{self.tabela}';
+                END
+            ''')
+
+    def _assinatura(self, conn):
+        """['versao', n] pelos triggers; ['conteudo', hash] se eles não puderem ser criados"""
+        versao = self._versao(conn)
+        if versao is None:
+            try:
+                self.instalar_versao(conn)
+                versao = self._versao(conn)
+            except sqlite3.OperationalError:
+                pass  # somente leitura
+        if versao is not None:
+            return ['versao', versao]
+        conteudo = '\n'.join(f'{id_}\t{nome}' for id_, nome in self._pares(conn))
+        return ['conteudo', hashlib.sha1(conteudo.encode('utf-8')).hexdigest()]
+
+    def _preencher(self, pares):
+        self.ids.clear()
+        self.nomes.clear()
+        for id_, nome in pares:
+            self._registrar(id_, nome)
+
+    def _registrar(self, id_, nome):
+        nome = sys.intern(nome)
+        self.ids[nome] = id_
+        self.nomes[id_] = nome
+
+    def carregar(self, conn, caminho_cache=None):
+        """Garante o mapa em dia com a tabela: memória, cache em disco ou SELECT"""
+        assinatura = self._assinatura(conn)
+        if assinatura == self.assinatura:
+            return self
+        cache = _ler_cache(caminho_cache).get(self.tabela) if caminho_cache else None
+        if cache and cache['assinatura'] == assinatura:
+            self._preencher(cache['itens'])
+        else:
+            self._preencher(self._pares(conn))
+            if caminho_cache:
+                _gravar_cache(caminho_cache, self.tabela,
+                              {'assinatura': assinatura, 'itens': list(self.nomes.items())})
+        self.assinatura = assinatura
+        return self
+
+    def resolver(self, conn, nomes):
+        """Insere em lote só os nomes ainda desconhecidos e atualiza o mapa"""
+        novos = [nome for nome in set(nomes) if nome not in self.ids]
+        if not novos:
+            return
+        conn.executemany(f'INSERT OR IGNORE INTO {self.tabela} ({self.coluna_nome}) VALUES (?)',
+                         [(n,) for n in novos])
+        marcadores = ','.join('?' * len(novos))
+        for id_, nome in conn.execute(
+            f'SELECT {self.coluna_id}, {self.coluna_nome} FROM {self.tabela} '
+            f'WHERE {self.coluna_nome} IN ({marcadores})', novos
+        ):
+            self._registrar(id_, nome)
+        # O cache em disco é regravado na próxima carga (a versão mudou)
+        self.assinatura = None
+
+
+def caminho_cache(conn):
+    """Arquivo de cache ao lado do banco principal (None para bancos em memória)"""
+    arquivo = next((row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main'), '')
+    return arquivo + '.dimensoes.json' if arquivo else None
+
+
+def _ler_cache(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar_cache(caminho, tabela, conteudo):
+    cache = _ler_cache(caminho)
+    cache[tabela] = conteudo
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    try:
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temporario, caminho)
+    except OSError:
+        pass  # sem cache em disco a dimensão só é relida do banco
+
+
+def dimensao(conn, nome):
+    """Dimensão `nome` ('apps' ou 'categorias') do banco de `conn`, carregada e em dia"""
+    cache = caminho_cache(conn)
+    if cache is None:
+        # Banco em memória: sem identidade estável entre conexões, nada é compartilhado
+        return Dimensao(*DIMENSOES[nome]).carregar(conn)
+    chave = (cache, nome)
+    if chave not in _carregadas:
+        _carregadas[chave] = Dimensao(*DIMENSOES[nome])
+    return _carregadas[chave].carregar(conn, cache)
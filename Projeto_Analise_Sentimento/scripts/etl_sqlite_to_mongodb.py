@@ -1,41 +1,286 @@
-import sqlite3
-from pymongo import MongoClient
+"""
+ETL do SQLite para o MongoDB em lotes.
+
+As reviews são lidas com `fetchmany` e gravadas com `insert_many` não
+ordenado por um pequeno conjunto de workers, cada um responsável por um
+grupo de `id_app`. A carga vai para coleções de staging que só substituem
+as definitivas (rename) no final, então as coleções nunca ficam vazias
+durante o job. Use `--mongo-uri mongomock://` para rodar sem um mongod.
+
+No modo `--incremental` a carga completa só acontece na primeira vez: daí
+em diante os triggers de `captura_mudancas.sql` registram cada alteração
+de Reviews em `Reviews_Changelog` e apenas essas reviews são enviadas
+(upsert/delete por `_id = id_review_sqlite` via `bulk_write`). A posição já
+sincronizada fica em `Sync_Estado`, no próprio SQLite.
+
+O nome do app (`nome_app`/`app`) vem de um JOIN com Aplicativos na própria
+extração; a coleção `aplicativos` sai do mapa compartilhado de dimensoes.py.
+
+Toda carga ou sincronização que altera `reviews` incrementa a versão em
+`controle_sincronizacao`; quem guarda resultados derivados da coleção (o
+cache de exportar_consultas_mongodb.py) usa essa versão como marcador.
+"""
+
+import argparse
 import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import DeleteOne, MongoClient, ReplaceOne
+
+from dimensoes import dimensao
+from instrumentacao import etapa, medido
 
 # Caminho correto para o banco SQLite
 script_dir = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+cdc_sql_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/captura_mudancas.sql'))
+
+MONGO_URI = 'mongodb://localhost:27017/'
+NOME_BANCO = 'analise_sentimento'
+TAMANHO_LOTE = 10_000
+NUM_WORKERS = 4
+COLECAO_CONTROLE = 'controle_sincronizacao'
+
+# Colunas opcionais de Reviews (melhorias_avaliacao.sql) levadas quando existirem
+COLUNAS_METRICAS = ['char_count', 'word_count', 'has_noise', 'sentiment_label', 'model_sentiment']
+
+
+def conectar_mongo(uri=MONGO_URI):
+    """Abre o cliente MongoDB; 'mongomock://' usa o mongomock em memória"""
+    if uri.startswith('mongomock://'):
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(uri)
+
+
+def colunas_reviews(conn):
+    """Colunas de Reviews a extrair, conforme o schema do banco"""
+    existentes = {row[1] for row in conn.execute('PRAGMA table_info(Reviews)')}
+    return ['id_review_sqlite', 'review_uuid', 'score', 'id_app'] + \
+        [c for c in COLUNAS_METRICAS if c in existentes]
+
+
+def dividir_apps(conn, num_workers):
+    """Distribui os id_app entre os workers equilibrando o número de reviews"""
+    contagens = conn.execute(
+        'SELECT id_app, COUNT(*) FROM Reviews GROUP BY id_app ORDER BY COUNT(*) DESC'
+    ).fetchall()
+    grupos = [{'ids': [], 'total': 0} for _ in range(max(1, min(num_workers, len(contagens))))]
+    for id_app, total in contagens:
+        menor = min(grupos, key=lambda g: g['total'])
+        menor['ids'].append(id_app)
+        menor['total'] += total
+    return [g['ids'] for g in grupos if g['ids']]
+
+
+def filtro_apps(ids):
+    """Cláusula WHERE para um grupo de id_app (NULL incluído quando presente)"""
+    validos = [i for i in ids if i is not None]
+    partes = []
+    if validos:
+        partes.append(f"id_app IN ({','.join('?' * len(validos))})")
+    if len(validos) != len(ids):
+        partes.append('id_app IS NULL')
+    return ' OR '.join(partes), validos
+
+
+def sql_extracao(colunas, where):
+    """SELECT das colunas de Reviews com o nome do app já resolvido pelo JOIN"""
+    return (f"SELECT {', '.join(colunas)}, a.nome FROM Reviews "
+            f"LEFT JOIN Aplicativos a USING (id_app) WHERE {where}")
+
+
+def montar_documento(colunas, row):
+    """Converte uma linha da extração (colunas + nome do app) no documento do MongoDB"""
+    doc = dict(zip(colunas, row))
+    doc['_id'] = doc.pop('id_review_sqlite')
+    doc['nome_app'] = row[-1]
+    # Mesmo nome de campo do dataset original, usado pelas consultas de consultas_mongodb/
+    doc['app'] = doc['nome_app']
+    return doc
+
+
+def copiar_grupo(caminho_db, colecao, colunas, ids, tamanho_lote):
+    """Worker: copia as reviews de um grupo de apps em lotes de insert_many"""
+    conn = sqlite3.connect(caminho_db)
+    where, parametros = filtro_apps(ids)
+    cursor = conn.execute(sql_extracao(colunas, where), parametros)
+    copiados = 0
+    while True:
+        rows = cursor.fetchmany(tamanho_lote)
+        if not rows:
+            break
+        with etapa('etl.lote', linhas=len(rows), perfil=False):
+            colecao.insert_many([montar_documento(colunas, row) for row in rows], ordered=False)
+        copiados += len(rows)
+    conn.close()
+    return copiados
+
+
+def marcar_mudanca(db, colecao='reviews'):
+    """Incrementa a versão da coleção (invalida resultados derivados dela)"""
+    db[COLECAO_CONTROLE].update_one(
+        {'_id': colecao},
+        {'$inc': {'versao': 1}, '$set': {'atualizado_em': time.strftime('%Y-%m-%dT%H:%M:%S')}},
+        upsert=True
+    )
+
+
+@medido('etl')
+def executar_etl(caminho_db, db, tamanho_lote=TAMANHO_LOTE, num_workers=NUM_WORKERS):
+    """Copia Aplicativos e Reviews para `db` (banco do MongoDB) via staging + rename"""
+    inicio = time.perf_counter()
+    conn = sqlite3.connect(caminho_db)
+
+    # Extrair aplicativos
+    dict_apps = dimensao(conn, 'apps').nomes
+    colunas = colunas_reviews(conn)
+    grupos = dividir_apps(conn, num_workers)
+    conn.close()
+
+    apps_staging = db['aplicativos_staging']
+    reviews_staging = db['reviews_staging']
+    apps_staging.drop()
+    reviews_staging.drop()
+
+    if dict_apps:
+        apps_staging.insert_many([{'_id': k, 'nome': v} for k, v in dict_apps.items()], ordered=False)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(grupos))) as pool:
+        futuros = [
+            pool.submit(copiar_grupo, caminho_db, reviews_staging, colunas, ids, tamanho_lote)
+            for ids in grupos
+        ]
+        total = sum(f.result() for f in futuros)
+
+    # Troca atômica: as coleções antigas só somem quando as novas estão prontas
+    if dict_apps:
+        apps_staging.rename('aplicativos', dropTarget=True)
+    else:
+        db['aplicativos'].drop()
+    if total:
+        reviews_staging.rename('reviews', dropTarget=True)
+    else:
+        db['reviews'].drop()
+    marcar_mudanca(db)
+
+    duracao = time.perf_counter() - inicio
+    taxa = total / duracao if duracao > 0 else 0
+    print(f'{total} reviews em {duracao:.1f}s ({taxa:,.0f} docs/s, {len(grupos)} workers)')
+    return total
+
+
+def instalar_captura(conn):
+    """Cria changelog, estado de sincronização e triggers (idempotente)"""
+    with open(cdc_sql_path, encoding='utf-8') as f:
+        conn.executescript(f.read())
+
+
+def ler_estado(conn, destino):
+    """Último seq do changelog aplicado no destino (None se nunca sincronizou)"""
+    row = conn.execute('SELECT ultimo_seq FROM Sync_Estado WHERE destino = ?', (destino,)).fetchone()
+    return row[0] if row else None
+
+
+def gravar_estado(conn, destino, ultimo_seq):
+    """Registra a posição sincronizada e descarta o changelog já aplicado"""
+    with conn:
+        conn.execute('''
+            INSERT INTO Sync_Estado (destino, ultimo_seq, atualizado_em)
+            VALUES (?, ?, datetime('now'))
+            ON CONFLICT(destino) DO UPDATE SET
+                ultimo_seq = excluded.ultimo_seq,
+                atualizado_em = excluded.atualizado_em
+        ''', (destino, ultimo_seq))
+        # Só há um consumidor por destino: o que já foi aplicado em todos sai
+        conn.execute(
+            'DELETE FROM Reviews_Changelog WHERE seq <= (SELECT MIN(ultimo_seq) FROM Sync_Estado)'
+        )
+
+
+def operacoes_do_lote(conn, colunas, ids):
+    """Upsert das reviews que ainda existem e delete das que sumiram"""
+    marcadores = ','.join('?' * len(ids))
+    presentes = {}
+    for row in conn.execute(sql_extracao(colunas, f'id_review_sqlite IN ({marcadores})'), ids):
+        doc = montar_documento(colunas, row)
+        presentes[doc['_id']] = doc
+    return [
+        ReplaceOne({'_id': i}, presentes[i], upsert=True) if i in presentes else DeleteOne({'_id': i})
+        for i in ids
+    ]
+
+
+@medido('etl_incremental')
+def sincronizar_incremental(caminho_db, db, tamanho_lote=TAMANHO_LOTE, num_workers=NUM_WORKERS):
+    """Aplica em `db` (banco do MongoDB) apenas as mudanças registradas desde a última execução"""
+    inicio = time.perf_counter()
+    conn = sqlite3.connect(caminho_db)
+    instalar_captura(conn)
+    destino = db.name
+
+    ultimo_seq = ler_estado(conn, destino)
+    if ultimo_seq is None:
+        # Primeira execução: carga completa a partir da posição atual do changelog.
+        # Mudanças feitas durante a cópia são reaplicadas depois (upserts idempotentes).
+        ultimo_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM Reviews_Changelog').fetchone()[0]
+        print('Sem estado de sincronização: executando carga completa...')
+        executar_etl(caminho_db, db, tamanho_lote, num_workers)
+        gravar_estado(conn, destino, ultimo_seq)
+
+    dict_apps = dimensao(conn, 'apps').nomes
+    if dict_apps:
+        db['aplicativos'].bulk_write(
+            [ReplaceOne({'_id': k}, {'_id': k, 'nome': v}, upsert=True) for k, v in dict_apps.items()],
+            ordered=False
+        )
+    colunas = colunas_reviews(conn)
+
+    aplicadas = 0
+    while True:
+        mudancas = conn.execute(
+            'SELECT seq, id_review_sqlite FROM Reviews_Changelog WHERE seq > ? ORDER BY seq LIMIT ?',
+            (ultimo_seq, tamanho_lote)
+        ).fetchall()
+        if not mudancas:
+            break
+        # Várias mudanças da mesma review no lote viram uma única operação
+        ids = list(dict.fromkeys(id_review for _, id_review in mudancas))
+        with etapa('lote', linhas=len(ids), perfil=False):
+            db['reviews'].bulk_write(operacoes_do_lote(conn, colunas, ids), ordered=False)
+        ultimo_seq = mudancas[-1][0]
+        gravar_estado(conn, destino, ultimo_seq)
+        aplicadas += len(ids)
+
+    conn.close()
+    if aplicadas:
+        marcar_mudanca(db)
+    duracao = time.perf_counter() - inicio
+    print(f'{aplicadas} reviews sincronizadas em {duracao:.1f}s')
+    return aplicadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migra Aplicativos e Reviews do SQLite para o MongoDB.')
+    parser.add_argument('--db', default=db_path, help='banco SQLite de origem')
+    parser.add_argument('--mongo-uri', default=MONGO_URI, help="URI do MongoDB ('mongomock://' para testes)")
+    parser.add_argument('--banco', default=NOME_BANCO, help='banco de destino no MongoDB')
+    parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE, help='documentos por insert_many')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS, help='workers em paralelo')
+    parser.add_argument('--incremental', action='store_true',
+                        help='envia apenas as mudanças capturadas desde a última sincronização')
+    args = parser.parse_args(argv)
+
+    client = conectar_mongo(args.mongo_uri)
+    if args.incremental:
+        sincronizar_incremental(args.db, client[args.banco], args.tamanho_lote, args.workers)
+    else:
+        executar_etl(args.db, client[args.banco], args.tamanho_lote, args.workers)
+    client.close()
+    print('ETL concluído: dados do SQLite migrados para o MongoDB.')
+
 
-# Conexão com o SQLite
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-# Conexão com o MongoDB (localhost padrão)
-client = MongoClient('mongodb://localhost:27017/')
-db = client['analise_sentimento']
-apps_collection = db['aplicativos']
-reviews_collection = db['reviews']
-
-# Limpar coleções para evitar duplicidade
-apps_collection.delete_many({})
-reviews_collection.delete_many({})
-
-# Extrair aplicativos
-dict_apps = {}
-for row in cursor.execute('SELECT id_app, nome FROM Aplicativos'):
-    app_doc = {'_id': row[0], 'nome': row[1]}
-    apps_collection.insert_one(app_doc)
-    dict_apps[row[0]] = row[1]
-
-# Extrair reviews e inserir no MongoDB
-for row in cursor.execute('SELECT id_review_sqlite, review_uuid, score, id_app FROM Reviews'):
-    review_doc = {
-        '_id': row[0],
-        'review_uuid': row[1],
-        'score': row[2],
-        'id_app': row[3],
-        'nome_app': dict_apps.get(row[3], None)
-    }
-    reviews_collection.insert_one(review_doc)
-
-print('ETL concluído: dados do SQLite migrados para o MongoDB.') 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
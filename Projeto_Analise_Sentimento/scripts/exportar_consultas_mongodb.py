@@ -0,0 +1,206 @@
+"""
+Executa as agregações de consultas_mongodb/*.js e grava os CSVs de
+dados_exportados_csv/, sem passar pela aba Aggregation do Atlas.
+
+- Cada arquivo `N_agregacao_<nome>.js` (comentários `//` + pipeline em JSON)
+  vira `dados_<nome>.csv`; listas de subdocumentos no resultado (como o
+  `$push` da consulta 3) são expandidas em uma linha por item.
+- As agregações rodam com `allowDiskUse`, e os índices compostos sobre
+  `model_sentiment`, `score` e `app` são criados antes.
+- O resultado de cada pipeline fica em cache na coleção `cache_agregacoes`,
+  com chave = hash do pipeline + versão da coleção em `controle_sincronizacao`
+  (incrementada pelo ETL a cada carga/sincronização). Exportar de novo sem
+  mudanças nos dados não varre a coleção. Sem versão registrada, não há cache.
+- Com `--combinado`, as quatro consultas saem de uma única varredura: um
+  `$group` por (app, score, model_sentiment), cujas poucas linhas são
+  consolidadas no pandas nos mesmos quatro CSVs.
+
+Use `--mongo-uri mongomock://` para rodar sem um mongod.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+
+import pandas as pd
+
+from etl_sqlite_to_mongodb import COLECAO_CONTROLE, MONGO_URI, NOME_BANCO, conectar_mongo
+from instrumentacao import etapa
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+consultas_path = os.path.abspath(os.path.join(script_dir, '../consultas_mongodb'))
+saida_path = os.path.abspath(os.path.join(script_dir, '../dados_exportados_csv'))
+
+COLECAO_CACHE = 'cache_agregacoes'
+# Índices compostos que atendem os $group das consultas
+INDICES = [
+    [('app', 1), ('model_sentiment', 1), ('score', 1)],
+    [('score', 1), ('model_sentiment', 1)],
+]
+
+# Modo combinado: um $group com a granularidade mais fina das quatro consultas
+PIPELINE_COMBINADO = [
+    {'$group': {'_id': {'app': '$app', 'score': '$score', 'sentimento': '$model_sentiment'},
+                'contagem': {'$sum': 1}}},
+]
+# CSV -> (colunas do agrupamento, ordenar pelas colunas), mesmo formato das consultas 1 a 4
+CONSOLIDACOES = {
+    'dados_proporcao_sentimentos.csv': (['sentimento'], False),
+    'dados_contagem_total_scores.csv': (['score'], True),
+    'dados_sentimento_por_app.csv': (['app', 'sentimento'], False),
+    'dados_score_vs_sentimento.csv': (['score', 'sentimento'], True),
+}
+# Cabeçalhos dos CSVs já publicados que diferem do $project dos pipelines
+# (dados_contagem_total_scores.csv saiu do Atlas como _id,contagem)
+CABECALHOS = {
+    'dados_contagem_total_scores.csv': {'score': '_id'},
+}
+
+
+def carregar_pipeline(caminho):
+    """Lê o pipeline de um .js de consultas_mongodb/ (comentários // + JSON)"""
+    with open(caminho, encoding='utf-8') as f:
+        texto = '\n'.join(linha for linha in f if not linha.lstrip().startswith('//'))
+    return json.loads(texto)
+
+
+def arquivo_saida(caminho):
+    """1_agregacao_proporcao_sentimentos.js -> dados_proporcao_sentimentos.csv"""
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return 'dados_' + re.sub(r'^\d+_(agregacao_)?', '', nome) + '.csv'
+
+
+def criar_indices(colecao):
+    for chaves in INDICES:
+        colecao.create_index(chaves)
+
+
+def marcador_mudanca(db, colecao):
+    """Versão atual da coleção registrada pelo ETL (None se não houver)"""
+    controle = db[COLECAO_CONTROLE].find_one({'_id': colecao})
+    return controle.get('versao') if controle else None
+
+
+def chave_cache(pipeline, colecao, marcador):
+    texto = json.dumps(pipeline, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f'{colecao}|{marcador}|{texto}'.encode()).hexdigest()
+
+
+def executar_pipeline(db, colecao, pipeline, usar_cache=True):
+    """Resultado do pipeline: (documentos, veio_do_cache)"""
+    marcador = marcador_mudanca(db, colecao) if usar_cache else None
+    if marcador is None:
+        return list(db[colecao].aggregate(pipeline, allowDiskUse=True)), False
+
+    chave = chave_cache(pipeline, colecao, marcador)
+    salvo = db[COLECAO_CACHE].find_one({'_id': chave})
+    if salvo is not None:
+        return salvo['resultado'], True
+
+    resultado = list(db[colecao].aggregate(pipeline, allowDiskUse=True))
+    # Entradas de versões anteriores da coleção não servem mais
+    db[COLECAO_CACHE].delete_many({'colecao': colecao, 'marcador': {'$ne': marcador}})
+    db[COLECAO_CACHE].replace_one(
+        {'_id': chave},
+        {'_id': chave, 'colecao': colecao, 'marcador': marcador, 'resultado': resultado},
+        upsert=True
+    )
+    return resultado, False
+
+
+def achatar(documentos):
+    """Uma linha por documento; listas de subdocumentos viram uma linha por item"""
+    linhas = []
+    for doc in documentos:
+        listas = {k: v for k, v in doc.items() if isinstance(v, list)}
+        base = {k: v for k, v in doc.items() if k not in listas}
+        if not listas:
+            linhas.append(base)
+        for itens in listas.values():
+            linhas.extend({**base, **item} for item in itens)
+    return pd.DataFrame(linhas)
+
+
+def gravar_csv(tabela, destino):
+    """Grava o CSV com o cabeçalho publicado do arquivo (CABECALHOS)"""
+    tabela.rename(columns=CABECALHOS.get(os.path.basename(destino), {})).to_csv(destino, index=False)
+
+
+def exportar_consultas(db, colecao='reviews', pasta_consultas=consultas_path, pasta_saida=saida_path,
+                       usar_cache=True):
+    """Roda todos os pipelines da pasta e grava um CSV por pipeline"""
+    criar_indices(db[colecao])
+    os.makedirs(pasta_saida, exist_ok=True)
+    gerados = []
+    for caminho in sorted(glob.glob(os.path.join(pasta_consultas, '*.js'))):
+        inicio = time.perf_counter()
+        with etapa(os.path.basename(caminho)) as medida:
+            resultado, do_cache = executar_pipeline(db, colecao, carregar_pipeline(caminho), usar_cache)
+            medida.update(linhas=len(resultado), cache=do_cache)
+        destino = os.path.join(pasta_saida, arquivo_saida(caminho))
+        gravar_csv(achatar(resultado), destino)
+        origem = 'cache' if do_cache else 'agregação'
+        print(f'{os.path.basename(destino)}: {len(resultado)} documentos ({origem}, '
+              f'{time.perf_counter() - inicio:.2f}s)')
+        gerados.append(destino)
+    return gerados
+
+
+def consolidar(documentos):
+    """Soma as contagens de (app, score, sentimento) nos formatos das consultas 1 a 4"""
+    base = pd.DataFrame(
+        [{**{k: doc['_id'].get(k) for k in ('app', 'score', 'sentimento')}, 'contagem': doc['contagem']}
+         for doc in documentos],
+        columns=['app', 'score', 'sentimento', 'contagem']
+    )
+    tabelas = {}
+    for arquivo, (colunas, ordenar) in CONSOLIDACOES.items():
+        tabela = base.groupby(colunas, dropna=False, sort=ordenar)['contagem'].sum().reset_index()
+        tabelas[arquivo] = tabela
+    return tabelas
+
+
+def exportar_combinado(db, colecao='reviews', pasta_saida=saida_path, usar_cache=True):
+    """Gera os quatro CSVs a partir de uma única agregação"""
+    criar_indices(db[colecao])
+    os.makedirs(pasta_saida, exist_ok=True)
+    inicio = time.perf_counter()
+    with etapa('combinado') as medida:
+        resultado, do_cache = executar_pipeline(db, colecao, PIPELINE_COMBINADO, usar_cache)
+        medida.update(linhas=len(resultado), cache=do_cache)
+    gerados = []
+    for arquivo, tabela in consolidar(resultado).items():
+        destino = os.path.join(pasta_saida, arquivo)
+        gravar_csv(tabela, destino)
+        gerados.append(destino)
+    origem = 'cache' if do_cache else 'agregação'
+    print(f'{len(gerados)} CSVs de {len(resultado)} grupos ({origem}, {time.perf_counter() - inicio:.2f}s)')
+    return gerados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exporta para CSV as agregações de consultas_mongodb/.')
+    parser.add_argument('--mongo-uri', default=MONGO_URI, help="URI do MongoDB ('mongomock://' para testes)")
+    parser.add_argument('--banco', default=NOME_BANCO, help='banco do MongoDB')
+    parser.add_argument('--colecao', default='reviews', help='coleção agregada')
+    parser.add_argument('--consultas', default=consultas_path, help='pasta com os pipelines .js')
+    parser.add_argument('--saida', default=saida_path, help='pasta dos CSVs')
+    parser.add_argument('--sem-cache', action='store_true', help='sempre executa as agregações')
+    parser.add_argument('--combinado', action='store_true',
+                        help='uma única varredura para as consultas 1 a 4, consolidada no pandas')
+    args = parser.parse_args(argv)
+
+    client = conectar_mongo(args.mongo_uri)
+    if args.combinado:
+        exportar_combinado(client[args.banco], args.colecao, args.saida, not args.sem_cache)
+    else:
+        exportar_consultas(client[args.banco], args.colecao, args.consultas, args.saida, not args.sem_cache)
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Frequência de palavras nas reviews de um sentimento (por padrão, negativas).
+
+Regenera os exports `negativo.csv` / `negativo sem stopwords.csv` (feitos à mão
+em agregações do Atlas) no mesmo formato `_id,total`, dentro de
+`dados_exportados_csv/`.
+
+- O texto é lido em blocos (CSV fonte com `chunksize`, SQLite com
+  `fetchmany` ou MongoDB com cursor em lotes), nunca a base inteira de uma
+  vez. O importador e o ETL não gravam o texto das reviews, então o padrão
+  é o CSV; as fontes sqlite/mongo só servem a bancos que tenham `content`.
+- Os blocos são tokenizados em paralelo por um pool de processos, com no
+  máximo 2 blocos por worker em andamento.
+- As contagens são exatas: um Counter em memória que, ao passar de
+  `limite_chaves` palavras distintas, é despejado em um SQLite temporário
+  (upsert somando os totais). A memória fica limitada ao Counter + blocos em
+  andamento.
+- Uma única passada conta todas as palavras; as stopwords (EN/PT, mais um
+  arquivo opcional) só são aplicadas na hora de escrever o ranking, então os
+  dois CSVs saem da mesma contagem.
+
+A capitalização é preservada como nos exports originais ('I', 'The'); a
+comparação com as stopwords ignora maiúsculas.
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from instrumentacao import medido
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+csv_path = os.path.abspath(os.path.join(script_dir, '../dados_fonte/mensageiros_processado.csv'))
+saida_path = os.path.abspath(os.path.join(script_dir, '../dados_exportados_csv'))
+
+TAMANHO_BLOCO = 20_000
+LIMITE_CHAVES = 500_000
+TOP_PALAVRAS = 20
+COLUNA_TEXTO = 'content'
+COLUNA_SENTIMENTO = 'model_sentiment'
+SENTIMENTO = 'negativo'
+
+# Palavras com apóstrofo interno ficam inteiras: can't, I'm, doesn't
+PADRAO_PALAVRA = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+
+STOPWORDS = {
+    'en': frozenset('''
+        a about above after again against all am an and any are aren't as at be because been before
+        being below between both but by can can't cannot could couldn't did didn't do does doesn't
+        doing don't down during each few for from further had hadn't has hasn't have haven't having he
+        he'd he'll he's her here here's hers herself him himself his how how's i i'd i'll i'm i've if
+        in into is isn't it it's its itself just let's me more most mustn't my myself no nor not now of
+        off on once only or other ought our ours ourselves out over own same shan't she she'd she'll
+        she's should shouldn't so some such than that that's the their theirs them themselves then there
+        there's these they they'd they'll they're they've this those through to too under until up very
+        was wasn't we we'd we'll we're we've were weren't what what's when when's where where's which
+        while who who's whom why why's will with won't would wouldn't you you'd you'll you're you've
+        your yours yourself yourselves im dont cant also get got even still
+    '''.split()),
+    'pt': frozenset('''
+        a ao aos aquela aquelas aquele aqueles aquilo as até com como da das de dela delas dele deles
+        depois do dos e ela elas ele eles em entre era eram essa essas esse esses esta estas este estes
+        eu foi foram há isso isto já lhe lhes mais mas me mesmo meu meus minha minhas muito na nas nem
+        no nos nossa nossas nosso nossos num numa não o os ou para pela pelas pelo pelos por qual quando
+        que quem se sem ser seu seus sua suas são só também te tem tinha tu tua tuas tudo um uma umas
+        uns você vocês vos está estão estou ter pra pro
+    '''.split()),
+}
+
+
+def carregar_stopwords(idiomas, arquivo=None):
+    """Stopwords (minúsculas) dos idiomas escolhidos, mais uma por linha do arquivo"""
+    stopwords = set()
+    for idioma in idiomas:
+        stopwords |= STOPWORDS[idioma]
+    if arquivo:
+        with open(arquivo, encoding='utf-8') as f:
+            stopwords |= {linha.strip().lower() for linha in f if linha.strip()}
+    return stopwords
+
+
+def contar_bloco(textos):
+    """Worker: conta as palavras de um bloco de textos"""
+    contagem = Counter()
+    for texto in textos:
+        if texto:
+            contagem.update(PADRAO_PALAVRA.findall(texto))
+    return contagem
+
+
+class ContadorComDespejo:
+    """Counter exato que despeja em um SQLite temporário ao passar de `limite_chaves` palavras"""
+
+    def __init__(self, limite_chaves=LIMITE_CHAVES):
+        self.limite_chaves = limite_chaves
+        self.memoria = Counter()
+        self.conn = None
+        self.caminho = None
+        self.despejos = 0
+
+    def atualizar(self, contagem):
+        self.memoria.update(contagem)
+        if len(self.memoria) > self.limite_chaves:
+            self.despejar()
+
+    def despejar(self):
+        if not self.memoria:
+            return
+        if self.conn is None:
+            fd, self.caminho = tempfile.mkstemp(suffix='.db', prefix='frequencia_')
+            os.close(fd)
+            self.conn = sqlite3.connect(self.caminho)
+            self.conn.execute('PRAGMA journal_mode = OFF')
+            self.conn.execute('PRAGMA synchronous = OFF')
+            self.conn.execute('CREATE TABLE contagem (palavra TEXT PRIMARY KEY, total INTEGER NOT NULL)')
+        with self.conn:
+            self.conn.executemany('''
+                INSERT INTO contagem (palavra, total) VALUES (?, ?)
+                ON CONFLICT(palavra) DO UPDATE SET total = total + excluded.total
+            ''', self.memoria.items())
+        self.memoria.clear()
+        self.despejos += 1
+
+    def mais_comuns(self, n, ignorar=frozenset()):
+        """As n palavras mais frequentes (desempate alfabético), pulando as de `ignorar`"""
+        if self.conn is None:
+            ordenadas = sorted(self.memoria.items(), key=lambda item: (-item[1], item[0]))
+        else:
+            self.despejar()
+            ordenadas = self.conn.execute('SELECT palavra, total FROM contagem ORDER BY total DESC, palavra')
+        resultado = []
+        for palavra, total in ordenadas:
+            if palavra.lower() not in ignorar:
+                resultado.append((palavra, total))
+                if len(resultado) == n:
+                    break
+        return resultado
+
+    def fechar(self):
+        if self.conn is not None:
+            self.conn.close()
+            os.remove(self.caminho)
+            self.conn = None
+
+
+def tabela_com_texto(conn, coluna_sentimento):
+    """Tabela do SQLite que tem o texto e a coluna de sentimento (Reviews ou avaliacoes)"""
+    for tabela in ('Reviews', 'avaliacoes'):
+        colunas = {row[1] for row in conn.execute(f'PRAGMA table_info({tabela})')}
+        if {COLUNA_TEXTO, coluna_sentimento} <= colunas:
+            return tabela
+    raise ValueError(f"Nenhuma tabela do SQLite tem as colunas '{COLUNA_TEXTO}' e '{coluna_sentimento}': "
+                     "o importador não grava o texto das reviews (use --fonte csv)")
+
+
+def blocos_sqlite(caminho_db, coluna_sentimento, sentimento, tamanho_bloco):
+    """Blocos de textos do SQLite; levanta ValueError já na chamada se o banco não tiver o texto"""
+    conn = sqlite3.connect(caminho_db)
+    try:
+        tabela = tabela_com_texto(conn, coluna_sentimento)
+    except ValueError:
+        conn.close()
+        raise
+    cursor = conn.execute(f'SELECT {COLUNA_TEXTO} FROM {tabela} WHERE {coluna_sentimento} = ?', (sentimento,))
+    return _ler_cursor(conn, cursor, tamanho_bloco)
+
+
+def _ler_cursor(conn, cursor, tamanho_bloco):
+    while True:
+        rows = cursor.fetchmany(tamanho_bloco)
+        if not rows:
+            break
+        yield [row[0] for row in rows]
+    conn.close()
+
+
+def blocos_mongo(uri, banco, coluna_sentimento, sentimento, tamanho_bloco):
+    """Blocos de textos do MongoDB; levanta ValueError já na chamada se os documentos não tiverem o texto"""
+    from etl_sqlite_to_mongodb import conectar_mongo
+
+    client = conectar_mongo(uri)
+    colecao = client[banco]['reviews']
+    if colecao.find_one({COLUNA_TEXTO: {'$exists': True}}, {'_id': 1}) is None:
+        client.close()
+        raise ValueError(f"Nenhum documento de {banco}.reviews tem o campo '{COLUNA_TEXTO}': "
+                         "o ETL não leva o texto das reviews (use --fonte csv)")
+    cursor = colecao.find({coluna_sentimento: sentimento}, {COLUNA_TEXTO: 1, '_id': 0}).batch_size(tamanho_bloco)
+    return _ler_mongo(client, cursor, tamanho_bloco)
+
+
+def _ler_mongo(client, cursor, tamanho_bloco):
+    bloco = []
+    for doc in cursor:
+        bloco.append(doc.get(COLUNA_TEXTO))
+        if len(bloco) == tamanho_bloco:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+    client.close()
+
+
+def blocos_csv(caminho_csv, coluna_sentimento, sentimento, tamanho_bloco):
+    for bloco in pd.read_csv(caminho_csv, usecols=[COLUNA_TEXTO, coluna_sentimento], chunksize=tamanho_bloco):
+        yield bloco.loc[bloco[coluna_sentimento] == sentimento, COLUNA_TEXTO].dropna().astype(str).tolist()
+
+
+@medido('frequencia_palavras')
+def contar_palavras(blocos, workers=None, limite_chaves=LIMITE_CHAVES):
+    """Conta as palavras de todos os blocos em paralelo, com memória limitada"""
+    workers = workers or os.cpu_count() or 1
+    contador = ContadorComDespejo(limite_chaves)
+    pendentes = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for bloco in blocos:
+            if len(pendentes) >= 2 * workers:
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    contador.atualizar(futuro.result())
+            pendentes.add(pool.submit(contar_bloco, bloco))
+        for futuro in pendentes:
+            contador.atualizar(futuro.result())
+    return contador
+
+
+def gravar_ranking(contador, caminho, n, ignorar=frozenset()):
+    """Grava o ranking no formato dos exports do Atlas (_id,total)"""
+    pd.DataFrame(contador.mais_comuns(n, ignorar), columns=['_id', 'total']).to_csv(caminho, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Frequência de palavras nas reviews de um sentimento.')
+    parser.add_argument('--fonte', default='csv', choices=['csv', 'sqlite', 'mongo'],
+                        help='origem do texto (sqlite/mongo só se o banco tiver a coluna content)')
+    parser.add_argument('--db', default=db_path, help='banco SQLite (fonte sqlite)')
+    parser.add_argument('--csv', default=csv_path, help='CSV fonte (fonte csv)')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/', help='URI do MongoDB (fonte mongo)')
+    parser.add_argument('--banco', default='analise_sentimento', help='banco do MongoDB (fonte mongo)')
+    parser.add_argument('--coluna-sentimento', default=COLUNA_SENTIMENTO, help='coluna usada no filtro')
+    parser.add_argument('--sentimento', default=SENTIMENTO, help='valor do filtro de sentimento')
+    parser.add_argument('--idiomas', nargs='+', default=['en', 'pt'], choices=sorted(STOPWORDS),
+                        help='listas de stopwords aplicadas')
+    parser.add_argument('--stopwords', help='arquivo com stopwords extras (uma por linha)')
+    parser.add_argument('--top', type=int, default=TOP_PALAVRAS, help='palavras no ranking')
+    parser.add_argument('--workers', type=int, default=None, help='processos de tokenização')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='textos por bloco')
+    parser.add_argument('--limite-chaves', type=int, default=LIMITE_CHAVES,
+                        help='palavras distintas em memória antes de despejar em disco')
+    parser.add_argument('--saida', default=saida_path, help='pasta dos CSVs')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.fonte == 'sqlite':
+            blocos = blocos_sqlite(args.db, args.coluna_sentimento, args.sentimento, args.tamanho_bloco)
+        elif args.fonte == 'mongo':
+            blocos = blocos_mongo(args.mongo_uri, args.banco, args.coluna_sentimento, args.sentimento,
+                                  args.tamanho_bloco)
+        else:
+            blocos = blocos_csv(args.csv, args.coluna_sentimento, args.sentimento, args.tamanho_bloco)
+    except ValueError as e:
+        parser.error(str(e))
+
+    inicio = time.perf_counter()
+    contador = contar_palavras(blocos, args.workers, args.limite_chaves)
+    os.makedirs(args.saida, exist_ok=True)
+    com_stopwords = os.path.join(args.saida, f'dados_palavras_{args.sentimento}.csv')
+    sem_stopwords = os.path.join(args.saida, f'dados_palavras_{args.sentimento}_sem_stopwords.csv')
+    gravar_ranking(contador, com_stopwords, args.top)
+    gravar_ranking(contador, sem_stopwords, args.top, carregar_stopwords(args.idiomas, args.stopwords))
+    despejos = contador.despejos
+    contador.fechar()
+    print(f'Palavras contadas em {time.perf_counter() - inicio:.1f}s ({despejos} despejos em disco)')
+    print(f'Rankings salvos em: {com_stopwords} e {sem_stopwords}')
+
+
+if __name__ == '__main__':
+    main()
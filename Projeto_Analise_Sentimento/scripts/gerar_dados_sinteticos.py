@@ -0,0 +1,129 @@
+"""
+Gerador vetorizado de reviews sintéticas para testes de carga.
+
+Mesmas distribuições dos dados simulados dos gráficos (score 1-5 com
+p=[0.1, 0.15, 0.2, 0.3, 0.25], 1 a 49 palavras, ~5 caracteres por palavra,
+30% com ruído, sentimento derivado do score), mas cada coluna sai de uma
+única chamada ao gerador do numpy, em blocos de `tamanho_bloco` linhas. O
+gerador é semeado: a mesma semente (e o mesmo tamanho de bloco) produz os
+mesmos dados.
+
+Destinos:
+- csv: mesmo formato do CSV fonte lido por importar_csv_para_sqlite.py;
+- sqlite: direto em Reviews/Aplicativos (schema.sql + colunas de métricas),
+  com os mesmos INSERTs do importador;
+- parquet: arquivo único com tipos compactos (dados_graficos.tipar).
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from dados_graficos import tipar
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+schema_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/schema.sql'))
+
+TAMANHO_BLOCO = 500_000
+SEMENTE = 42
+
+APPS = ['WhatsApp', 'Facebook Messenger', 'Skype', 'Viber', 'LINE']
+SCORES = [1, 2, 3, 4, 5]
+PROBABILIDADES_SCORE = [0.1, 0.15, 0.2, 0.3, 0.25]
+PROBABILIDADE_RUIDO = 0.3
+SENTIMENTOS = np.array(['negativo', 'neutro', 'positivo'])
+
+
+def gerar_bloco(rng, n, inicio=0, apps=APPS):
+    """Um bloco de n reviews; reviewId sequencial a partir de `inicio`"""
+    score = rng.choice(np.array(SCORES, dtype=np.int8), size=n, p=PROBABILIDADES_SCORE)
+    word_count = rng.integers(1, 50, size=n, dtype=np.int16)
+    char_count = word_count * 5 + rng.integers(-10, 10, size=n, dtype=np.int16)
+    has_noise = rng.random(n) < PROBABILIDADE_RUIDO
+    # negativo (<= 2), neutro (3), positivo (>= 4)
+    sentimento = pd.Categorical.from_codes(np.select([score <= 2, score == 3], [0, 1], 2), SENTIMENTOS)
+    return pd.DataFrame({
+        'reviewId': pd.Series(np.arange(inicio, inicio + n)).map('sint-{:012d}'.format),
+        'app': pd.Categorical.from_codes(rng.integers(0, len(apps), size=n), apps),
+        'score': score,
+        'word_count': word_count,
+        'char_count': char_count,
+        'has_noise': has_noise,
+        'sentiment_label': sentimento,
+        'model_sentiment': sentimento,
+    })
+
+
+def gerar_blocos(total, tamanho_bloco=TAMANHO_BLOCO, semente=SEMENTE):
+    """Gera `total` reviews em blocos de até `tamanho_bloco` linhas"""
+    rng = np.random.default_rng(semente)
+    for inicio in range(0, total, tamanho_bloco):
+        yield gerar_bloco(rng, min(tamanho_bloco, total - inicio), inicio)
+
+
+def escrever_csv(blocos, caminho):
+    for i, bloco in enumerate(blocos):
+        bloco.astype({'has_noise': np.int8}).to_csv(caminho, mode='w' if i == 0 else 'a',
+                                                     header=(i == 0), index=False)
+
+
+def escrever_sqlite(blocos, caminho_db):
+    """Insere direto em Reviews (cria o schema se preciso) com os INSERTs do importador"""
+    from dimensoes import dimensao
+    from importar_csv_para_sqlite import (SQL_INSERIR_REVIEW, configurar_conexao, garantir_colunas_reviews,
+                                          linhas_do_bloco)
+
+    conn = sqlite3.connect(caminho_db)
+    configurar_conexao(conn, 'OFF')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'Reviews'").fetchone() is None:
+        with open(schema_path, encoding='utf-8') as f:
+            conn.executescript(f.read())
+    garantir_colunas_reviews(conn)
+    apps = dimensao(conn, 'apps')
+    for bloco in blocos:
+        bloco = bloco.astype({'app': str, 'sentiment_label': str, 'model_sentiment': str})
+        with conn:
+            apps.resolver(conn, bloco['app'].unique())
+            conn.executemany(SQL_INSERIR_REVIEW, linhas_do_bloco(bloco, apps.ids))
+    conn.close()
+
+
+def escrever_parquet(blocos, caminho):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    escritor = None
+    for bloco in blocos:
+        tabela = pa.Table.from_pandas(tipar(bloco), preserve_index=False)
+        if escritor is None:
+            escritor = pq.ParquetWriter(caminho, tabela.schema)
+        escritor.write_table(tabela.cast(escritor.schema))
+    if escritor is not None:
+        escritor.close()
+
+
+ESCRITORES = {'csv': escrever_csv, 'sqlite': escrever_sqlite, 'parquet': escrever_parquet}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera reviews sintéticas para testes de carga.')
+    parser.add_argument('--linhas', type=int, required=True, help='número de reviews')
+    parser.add_argument('--formato', default='csv', choices=sorted(ESCRITORES), help='destino')
+    parser.add_argument('--saida', required=True, help='arquivo CSV/Parquet ou banco SQLite')
+    parser.add_argument('--semente', type=int, default=SEMENTE, help='semente do gerador')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas por bloco')
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    ESCRITORES[args.formato](gerar_blocos(args.linhas, args.tamanho_bloco, args.semente), args.saida)
+    duracao = time.perf_counter() - inicio
+    taxa = args.linhas / duracao if duracao > 0 else 0
+    print(f'{args.linhas} reviews ({args.formato}) em {duracao:.1f}s ({taxa:,.0f} linhas/s): {args.saida}')
+
+
+if __name__ == '__main__':
+    main()
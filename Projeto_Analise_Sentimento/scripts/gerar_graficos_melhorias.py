@@ -3,14 +3,36 @@
 """
 Script para gerar gráficos das análises melhoradas do SQLite
 Baseado nas novas funcionalidades implementadas
+
+Os gráficos são renderizados em paralelo (um processo por gráfico, backend
+Agg). Cada PNG guarda nos metadados a impressão digital dos agregados que o
+geraram (mais o código da função e o dpi); se ela não mudou, o gráfico não é
+redesenhado. Use --forcar para redesenhar tudo.
 """
 
+import argparse
+import hashlib
+import inspect
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
 import seaborn as sns
 import sqlite3
 import numpy as np
 from pathlib import Path
+from PIL import Image
+
+from anomalias import anomalias_por_contagem
+from dados_graficos import (base_dataframe, base_parquet, base_sqlite, carregar_agregados,
+                             carregar_agregados_dataframe, reta_minimos_quadrados, snapshot_path, tipar)
+from gerar_dados_sinteticos import gerar_blocos
+from instrumentacao import medido, pico_memoria_filhos_mb, pico_memoria_mb
 
 # Configurações de estilo
 plt.style.use('seaborn-v0_8')
@@ -21,59 +43,79 @@ plt.rcParams['figure.figsize'] = (12, 8)
 # Configurar para português
 plt.rcParams['font.family'] = 'DejaVu Sans'
 
+PASTA_GRAFICOS = '../dashboard_bi'
+DPI = 300
+CHAVE_METADADOS = 'impressao_digital'
+
 def conectar_sqlite():
-    """Conecta ao banco SQLite"""
+    """Conecta ao banco SQLite; None se ele não existir ou não tiver Reviews/Aplicativos"""
     try:
-        conn = sqlite3.connect('../banco_de_dados_sqlite/database.db')
+        # mode=rw: não cria um banco vazio quando o arquivo não existe
+        conn = sqlite3.connect('file:../banco_de_dados_sqlite/database.db?mode=rw', uri=True)
+        conn.execute('SELECT r.word_count, a.nome FROM Reviews r JOIN Aplicativos a ON r.id_app = a.id_app LIMIT 1')
         return conn
-    except:
-        # Se não existir, criar dados simulados
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        # Sem banco utilizável: dados simulados
         return None
 
-def criar_dados_simulados():
-    """Cria dados simulados para demonstração"""
-    np.random.seed(42)
-    
-    # Dados simulados baseados no CSV original
-    apps = ['WhatsApp', 'Facebook Messenger', 'Skype', 'Viber', 'LINE']
-    
-    dados = []
-    for app in apps:
-        n_reviews = np.random.randint(800, 1200)
-        
-        for i in range(n_reviews):
-            score = np.random.choice([1, 2, 3, 4, 5], p=[0.1, 0.15, 0.2, 0.3, 0.25])
-            word_count = np.random.randint(1, 50)
-            char_count = word_count * 5 + np.random.randint(-10, 10)
-            has_noise = np.random.choice([0, 1], p=[0.7, 0.3])
-            
-            # Sentimento baseado no score
-            if score >= 4:
-                sentiment = 'positivo'
-            elif score <= 2:
-                sentiment = 'negativo'
-            else:
-                sentiment = 'neutro'
-            
-            dados.append({
-                'app': app,
-                'score': score,
-                'word_count': word_count,
-                'char_count': char_count,
-                'has_noise': has_noise,
-                'sentiment_label': sentiment,
-                'model_sentiment': sentiment
-            })
-    
-    return pd.DataFrame(dados)
+def criar_dados_simulados(n_reviews=5_000):
+    """Cria dados simulados para demonstração (gerador vetorizado de gerar_dados_sinteticos)"""
+    return tipar(next(gerar_blocos(n_reviews, tamanho_bloco=n_reviews, semente=42)).drop(columns='reviewId'))
+
+def relatorio_memoria(etapa, dados=None):
+    """Imprime o pico de RSS (processo e filhos) e o tamanho dos DataFrames da etapa"""
+    partes = []
+    if pico_memoria_mb() is not None:
+        partes.append(f'pico RSS {pico_memoria_mb():.0f} MB (maior filho {pico_memoria_filhos_mb():.0f} MB)')
+    if dados:
+        frames = sum(df.memory_usage(deep=True).sum() for df in dados.values()) / 1024 ** 2
+        partes.append(f'DataFrames {frames:.2f} MB')
+    if partes:
+        print(f"Memória [{etapa}]: {', '.join(partes)}")
+
+
+def impressao_digital(arquivo, dados):
+    """Hash dos agregados de entrada, do código da função e dos parâmetros do gráfico"""
+    h = hashlib.sha256()
+    h.update(f'{arquivo}|dpi={DPI}'.encode())
+    h.update(inspect.getsource(GRAFICOS[arquivo][1]).encode())
+    for chave in sorted(dados):
+        df = dados[chave]
+        h.update(chave.encode())
+        h.update(repr(list(zip(df.columns, df.dtypes.astype(str)))).encode())
+        h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
 
-def gerar_grafico_1_analise_qualidade(df):
+def impressao_salva(arquivo):
+    """Impressão digital gravada no PNG existente (None se não houver)"""
+    caminho = os.path.join(PASTA_GRAFICOS, arquivo)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with Image.open(caminho) as img:
+            return img.info.get(CHAVE_METADADOS)
+    except OSError:
+        return None
+
+
+def salvar_grafico(arquivo, dados):
+    """Salva a figura atual com a impressão digital nos metadados do PNG"""
+    plt.tight_layout()
+    plt.savefig(os.path.join(PASTA_GRAFICOS, arquivo), dpi=DPI, bbox_inches='tight',
+                metadata={CHAVE_METADADOS: impressao_digital(arquivo, dados)})
+    plt.close()
+
+
+@medido()
+def gerar_grafico_1_analise_qualidade(dados):
     """Gráfico 1: Análise de Qualidade por App"""
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle('Análise de Qualidade das Reviews por Aplicativo', fontsize=16, fontweight='bold')
     
     # 1. Média de Score por App
-    media_scores = df.groupby('app')['score'].mean().sort_values(ascending=False)
+    por_app = dados['por_app']
+    media_scores = por_app['media_score'].sort_values(ascending=False)
     bars1 = ax1.bar(media_scores.index, media_scores.values, color='skyblue', alpha=0.8)
     ax1.set_title('Média de Score por Aplicativo')
     ax1.set_ylabel('Score Médio')
@@ -86,7 +128,7 @@ def gerar_grafico_1_analise_qualidade(df):
                 f'{value:.2f}', ha='center', va='bottom', fontweight='bold')
     
     # 2. Distribuição de Sentimentos
-    sentimentos = df.groupby(['app', 'sentiment_label']).size().unstack(fill_value=0)
+    sentimentos = dados['app_sentimento'].groupby(['app', 'sentiment_label'])['contagem'].sum().unstack(fill_value=0)
     sentimentos.plot(kind='bar', stacked=True, ax=ax2, color=['#ff6b6b', '#4ecdc4', '#45b7d1'])
     ax2.set_title('Distribuição de Sentimentos por App')
     ax2.set_ylabel('Número de Reviews')
@@ -94,7 +136,7 @@ def gerar_grafico_1_analise_qualidade(df):
     ax2.legend(title='Sentimento')
     
     # 3. Percentual de Reviews sem Ruído
-    pct_sem_ruido = df.groupby('app')['has_noise'].apply(lambda x: (x == 0).mean() * 100)
+    pct_sem_ruido = por_app['pct_sem_ruido']
     bars3 = ax3.bar(pct_sem_ruido.index, pct_sem_ruido.values, color='lightgreen', alpha=0.8)
     ax3.set_title('Percentual de Reviews sem Ruído')
     ax3.set_ylabel('Percentual (%)')
@@ -107,7 +149,7 @@ def gerar_grafico_1_analise_qualidade(df):
                 f'{value:.1f}%', ha='center', va='bottom', fontweight='bold')
     
     # 4. Média de Palavras por App
-    media_palavras = df.groupby('app')['word_count'].mean().sort_values(ascending=False)
+    media_palavras = por_app['media_palavras'].sort_values(ascending=False)
     bars4 = ax4.bar(media_palavras.index, media_palavras.values, color='orange', alpha=0.8)
     ax4.set_title('Média de Palavras por Review')
     ax4.set_ylabel('Número de Palavras')
@@ -118,22 +160,21 @@ def gerar_grafico_1_analise_qualidade(df):
         ax4.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.2, 
                 f'{value:.1f}', ha='center', va='bottom', fontweight='bold')
     
-    plt.tight_layout()
-    plt.savefig('../dashboard_bi/01_analise_qualidade_por_app.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    salvar_grafico('01_analise_qualidade_por_app.png', dados)
 
-def gerar_grafico_2_correlacao_tamanho_score(df):
+@medido()
+def gerar_grafico_2_correlacao_tamanho_score(dados):
     """Gráfico 2: Correlação entre Tamanho e Score"""
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle('Correlação entre Tamanho das Reviews e Score', fontsize=16, fontweight='bold')
     
-    # Definir categorias de tamanho
-    df['tamanho_categoria'] = pd.cut(df['word_count'], 
-                                    bins=[0, 5, 10, 20, 100], 
-                                    labels=['Muito Curta (≤5)', 'Curta (6-10)', 'Média (11-20)', 'Longa (>20)'])
+    # Contagens por faixa de tamanho (calculadas no SQLite)
+    tamanho = dados['tamanho']
+    densidade = dados['densidade']
     
     # 1. Média de Score por Categoria de Tamanho
-    media_por_tamanho = df.groupby('tamanho_categoria')['score'].mean()
+    somas_por_tamanho = tamanho.groupby('tamanho_categoria', observed=False)[['soma_score', 'n_score']].sum()
+    media_por_tamanho = somas_por_tamanho['soma_score'] / somas_por_tamanho['n_score'].replace(0, np.nan)
     bars1 = ax1.bar(media_por_tamanho.index, media_por_tamanho.values, color='purple', alpha=0.8)
     ax1.set_title('Média de Score por Tamanho da Review')
     ax1.set_ylabel('Score Médio')
@@ -146,7 +187,7 @@ def gerar_grafico_2_correlacao_tamanho_score(df):
                 f'{value:.2f}', ha='center', va='bottom', fontweight='bold')
     
     # 2. Distribuição de Tamanhos por App
-    tamanhos_por_app = df.groupby(['app', 'tamanho_categoria']).size().unstack(fill_value=0)
+    tamanhos_por_app = tamanho.groupby(['app', 'tamanho_categoria'], observed=False)['contagem'].sum().unstack(fill_value=0)
     tamanhos_por_app.plot(kind='bar', stacked=True, ax=ax2, 
                          color=['#ff9999', '#66b3ff', '#99ff99', '#ffcc99'])
     ax2.set_title('Distribuição de Tamanhos por App')
@@ -154,20 +195,27 @@ def gerar_grafico_2_correlacao_tamanho_score(df):
     ax2.tick_params(axis='x', rotation=45)
     ax2.legend(title='Tamanho', bbox_to_anchor=(1.05, 1), loc='upper left')
     
-    # 3. Scatter plot: Palavras vs Score
-    ax3.scatter(df['word_count'], df['score'], alpha=0.6, s=20)
+    # 3. Densidade: Palavras vs Score (histograma 2D com as contagens do SQLite)
+    if not densidade.empty:
+        largura = densidade['largura_bin'].iloc[0]
+        bins_x = np.arange(0, densidade['bin_palavras'].max() + 2 * largura, largura)
+        _, _, _, malha = ax3.hist2d(densidade['bin_palavras'], densidade['score'],
+                                    bins=[bins_x, np.arange(0.5, 6.5)], weights=densidade['contagem'],
+                                    cmin=1, norm=LogNorm(), cmap='viridis')
+        fig.colorbar(malha, ax=ax3, label='Reviews')
     ax3.set_xlabel('Número de Palavras')
     ax3.set_ylabel('Score')
     ax3.set_title('Correlação: Palavras vs Score')
     ax3.grid(True, alpha=0.3)
     
-    # Adicionar linha de tendência
-    z = np.polyfit(df['word_count'], df['score'], 1)
-    p = np.poly1d(z)
-    ax3.plot(df['word_count'], p(df['word_count']), "r--", alpha=0.8)
+    # Adicionar linha de tendência (mínimos quadrados sobre as somas de todas as reviews)
+    reta = reta_minimos_quadrados(*dados['regressao'][['n', 'soma_x', 'soma_y', 'soma_xx', 'soma_xy']].iloc[0])
+    if reta:
+        x = np.array([0, dados['regressao']['max_palavras'].iloc[0]])
+        ax3.plot(x, reta[0] * x + reta[1], "r--", alpha=0.8)
     
     # 4. Percentual de Sentimentos por Tamanho
-    sentimentos_por_tamanho = df.groupby(['tamanho_categoria', 'sentiment_label']).size().unstack(fill_value=0)
+    sentimentos_por_tamanho = tamanho.groupby(['tamanho_categoria', 'sentiment_label'], observed=False)['contagem'].sum().unstack(fill_value=0)
     sentimentos_por_tamanho_pct = sentimentos_por_tamanho.div(sentimentos_por_tamanho.sum(axis=1), axis=0) * 100
     sentimentos_por_tamanho_pct.plot(kind='bar', stacked=True, ax=ax4, 
                                     color=['#ff6b6b', '#4ecdc4', '#45b7d1'])
@@ -176,38 +224,20 @@ def gerar_grafico_2_correlacao_tamanho_score(df):
     ax4.tick_params(axis='x', rotation=45)
     ax4.legend(title='Sentimento', bbox_to_anchor=(1.05, 1), loc='upper left')
     
-    plt.tight_layout()
-    plt.savefig('../dashboard_bi/02_correlacao_tamanho_score.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    salvar_grafico('02_correlacao_tamanho_score.png', dados)
 
-def gerar_grafico_3_categorizacao_inteligente(df):
+@medido()
+def gerar_grafico_3_categorizacao_inteligente(dados):
     """Gráfico 3: Sistema de Categorização Inteligente"""
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle('Sistema de Categorização Inteligente de Reviews', fontsize=16, fontweight='bold')
     
-    # Criar categorias baseadas nos critérios
-    def categorizar_review(row):
-        if row['word_count'] > 10 and row['sentiment_label'] == 'positivo':
-            return 'Reviews Detalhadas Positivas'
-        elif row['word_count'] > 10 and row['sentiment_label'] == 'negativo':
-            return 'Reviews Críticas Detalhadas'
-        elif row['word_count'] <= 5 and row['sentiment_label'] == 'positivo':
-            return 'Reviews Simples Positivas'
-        elif row['has_noise'] == 1:
-            return 'Reviews com Ruído'
-        elif row['has_noise'] == 0 and row['word_count'] > 10:
-            return 'Reviews de Alta Qualidade'
-        elif row['word_count'] > 10 and row['sentiment_label'] == 'neutro':
-            return 'Reviews Neutras Detalhadas'
-        elif row['score'] in [1, 5]:
-            return 'Reviews Extremas'
-        else:
-            return 'Reviews Balanceadas'
-    
-    df['categoria'] = df.apply(categorizar_review, axis=1)
+    # Contagens por (app, categoria), com as categorias do motor de categorização
+    categorias = dados['categoria']
+    por_categoria = categorias.groupby('categoria')[['contagem', 'soma_score', 'n_score', 'sem_ruido', 'soma_palavras']].sum()
     
     # 1. Distribuição de Categorias por App
-    categorias_por_app = df.groupby(['app', 'categoria']).size().unstack(fill_value=0)
+    categorias_por_app = categorias.groupby(['app', 'categoria'])['contagem'].sum().unstack(fill_value=0)
     categorias_por_app.plot(kind='bar', stacked=True, ax=ax1, 
                            colormap='tab10')
     ax1.set_title('Distribuição de Categorias por App')
@@ -216,7 +246,7 @@ def gerar_grafico_3_categorizacao_inteligente(df):
     ax1.legend(title='Categoria', bbox_to_anchor=(1.05, 1), loc='upper left')
     
     # 2. Média de Score por Categoria
-    media_score_categoria = df.groupby('categoria')['score'].mean().sort_values(ascending=False)
+    media_score_categoria = (por_categoria['soma_score'] / por_categoria['n_score']).sort_values(ascending=False)
     bars2 = ax2.bar(range(len(media_score_categoria)), media_score_categoria.values, 
                     color=plt.cm.Set3(np.linspace(0, 1, len(media_score_categoria))))
     ax2.set_title('Média de Score por Categoria')
@@ -230,8 +260,7 @@ def gerar_grafico_3_categorizacao_inteligente(df):
         ax2.text(i, value + 0.05, f'{value:.2f}', ha='center', va='bottom', fontweight='bold')
     
     # 3. Percentual de Categorias por App
-    pct_categorias = df.groupby(['app', 'categoria']).size().unstack(fill_value=0)
-    pct_categorias = pct_categorias.div(pct_categorias.sum(axis=1), axis=0) * 100
+    pct_categorias = categorias_por_app.div(categorias_por_app.sum(axis=1), axis=0) * 100
     pct_categorias.plot(kind='bar', stacked=True, ax=ax3, colormap='tab10')
     ax3.set_title('Percentual de Categorias por App')
     ax3.set_ylabel('Percentual (%)')
@@ -239,9 +268,9 @@ def gerar_grafico_3_categorizacao_inteligente(df):
     ax3.legend(title='Categoria', bbox_to_anchor=(1.05, 1), loc='upper left')
     
     # 4. Análise de Qualidade por Categoria
-    qualidade_categoria = df.groupby('categoria').agg({
-        'has_noise': lambda x: (x == 0).mean() * 100,
-        'word_count': 'mean'
+    qualidade_categoria = pd.DataFrame({
+        'has_noise': por_categoria['sem_ruido'] / por_categoria['contagem'] * 100,
+        'word_count': por_categoria['soma_palavras'] / por_categoria['contagem']
     }).round(2)
     
     x = np.arange(len(qualidade_categoria))
@@ -271,48 +300,25 @@ def gerar_grafico_3_categorizacao_inteligente(df):
     ax4.legend(loc='upper left')
     ax4_twin.legend(loc='upper right')
     
-    plt.tight_layout()
-    plt.savefig('../dashboard_bi/03_categorizacao_inteligente.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    salvar_grafico('03_categorizacao_inteligente.png', dados)
 
-def gerar_grafico_4_deteccao_anomalias(df):
+@medido()
+def gerar_grafico_4_deteccao_anomalias(dados):
     """Gráfico 4: Detecção de Anomalias"""
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle('Sistema de Detecção de Anomalias', fontsize=16, fontweight='bold')
     
-    # Calcular estatísticas por app
-    stats_app = df.groupby('app').agg({
-        'score': ['mean', 'std', 'count']
-    }).round(2)
-    stats_app.columns = ['media_score', 'desvio_score', 'total_reviews']
-    
-    # Identificar anomalias
-    anomalias = []
-    for app in df['app'].unique():
-        app_data = df[df['app'] == app]
-        media = app_data['score'].mean()
-        desvio = app_data['score'].std()
-        
-        for _, row in app_data.iterrows():
-            z_score = abs(row['score'] - media) / desvio if desvio > 0 else 0
-            if z_score > 1.5:
-                anomalias.append({
-                    'app': app,
-                    'score': row['score'],
-                    'media_app': media,
-                    'z_score': z_score,
-                    'diferenca': abs(row['score'] - media),
-                    'tipo': 'Alto' if row['score'] > media else 'Baixo'
-                })
-    
-    anomalias_df = pd.DataFrame(anomalias)
+    # Identificar anomalias (z-score por app a partir das contagens por score)
+    contagens = dados['app_score']
+    resultado = anomalias_por_contagem(contagens, limiar=1.5)
+    anomalias_df = resultado[resultado['anomalia']]
     
     # 1. Distribuição de Scores com Anomalias Destacadas
-    for app in df['app'].unique():
-        app_data = df[df['app'] == app]
+    for app in contagens['app'].unique():
+        app_data = contagens[contagens['app'] == app]
         app_anomalias = anomalias_df[anomalias_df['app'] == app]
         
-        ax1.hist(app_data['score'], alpha=0.6, label=app, bins=5)
+        ax1.hist(app_data['score'], weights=app_data['contagem'], alpha=0.6, label=app, bins=5)
         
         # Destacar anomalias
         if not app_anomalias.empty:
@@ -326,7 +332,9 @@ def gerar_grafico_4_deteccao_anomalias(df):
     
     # 2. Top Anomalias por Z-Score
     if not anomalias_df.empty:
-        top_anomalias = anomalias_df.nlargest(10, 'z_score')
+        # Uma linha por review (até 10 por grupo bastam para o top 10)
+        expandidas = anomalias_df.loc[anomalias_df.index.repeat(anomalias_df['contagem'].clip(upper=10))]
+        top_anomalias = expandidas.nlargest(10, 'z_score')
         bars2 = ax2.barh(range(len(top_anomalias)), top_anomalias['z_score'], 
                         color=['red' if x == 'Baixo' else 'orange' for x in top_anomalias['tipo']])
         ax2.set_yticks(range(len(top_anomalias)))
@@ -345,7 +353,7 @@ def gerar_grafico_4_deteccao_anomalias(df):
     
     # 3. Anomalias por App
     if not anomalias_df.empty:
-        anomalias_por_app = anomalias_df.groupby('app').size()
+        anomalias_por_app = anomalias_df.groupby('app')['contagem'].sum()
         bars3 = ax3.bar(anomalias_por_app.index, anomalias_por_app.values, color='lightcoral', alpha=0.8)
         ax3.set_title('Número de Anomalias por App')
         ax3.set_ylabel('Número de Anomalias')
@@ -360,34 +368,26 @@ def gerar_grafico_4_deteccao_anomalias(df):
                 transform=ax3.transAxes, fontsize=12)
         ax3.set_title('Anomalias por App')
     
-    # 4. Box Plot de Scores por App
-    df.boxplot(column='score', by='app', ax=ax4)
+    # 4. Box Plot de Scores por App (amostra)
+    dados['amostra'].boxplot(column='score', by='app', ax=ax4)
     ax4.set_title('Distribuição de Scores por App')
     ax4.set_xlabel('Aplicativo')
     ax4.set_ylabel('Score')
     ax4.tick_params(axis='x', rotation=45)
     
-    plt.tight_layout()
-    plt.savefig('../dashboard_bi/04_deteccao_anomalias.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    salvar_grafico('04_deteccao_anomalias.png', dados)
 
-def gerar_grafico_5_ranking_comparativo(df):
+@medido()
+def gerar_grafico_5_ranking_comparativo(dados):
     """Gráfico 5: Ranking Comparativo Entre Apps"""
     fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle('Ranking Comparativo Entre Aplicativos', fontsize=16, fontweight='bold')
     
-    # Calcular métricas para ranking
-    ranking_metrics = df.groupby('app').agg({
-        'score': ['mean', 'count'],
-        'word_count': 'mean',
-        'has_noise': lambda x: (x == 0).mean() * 100,
-        'sentiment_label': lambda x: (x == 'positivo').mean() * 100
-    }).round(2)
-    
-    ranking_metrics.columns = ['media_score', 'total_reviews', 'media_palavras', 'pct_sem_ruido', 'pct_positivo']
+    # Métricas e posições (RANK() OVER) calculadas no SQLite: view ranking_apps
+    ranking_metrics = dados['ranking']
     
     # 1. Ranking por Score
-    ranking_score = ranking_metrics.sort_values('media_score', ascending=False)
+    ranking_score = ranking_metrics.sort_values(['rank_score', 'app'])
     bars1 = ax1.bar(range(len(ranking_score)), ranking_score['media_score'], 
                     color=plt.cm.viridis(np.linspace(0, 1, len(ranking_score))))
     ax1.set_title('Ranking por Score Médio')
@@ -401,7 +401,7 @@ def gerar_grafico_5_ranking_comparativo(df):
         ax1.text(i, value + 0.05, f'{value:.2f}', ha='center', va='bottom', fontweight='bold')
     
     # 2. Ranking por Qualidade (sem ruído)
-    ranking_qualidade = ranking_metrics.sort_values('pct_sem_ruido', ascending=False)
+    ranking_qualidade = ranking_metrics.sort_values(['rank_qualidade', 'app'])
     bars2 = ax2.bar(range(len(ranking_qualidade)), ranking_qualidade['pct_sem_ruido'], 
                     color=plt.cm.plasma(np.linspace(0, 1, len(ranking_qualidade))))
     ax2.set_title('Ranking por Qualidade (Reviews sem Ruído)')
@@ -460,55 +460,79 @@ def gerar_grafico_5_ranking_comparativo(df):
     
     plt.colorbar(im, ax=ax4)
     
-    plt.tight_layout()
-    plt.savefig('../dashboard_bi/05_ranking_comparativo.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    salvar_grafico('05_ranking_comparativo.png', dados)
+
+# arquivo -> (descrição, função, agregados usados)
+GRAFICOS = {
+    '01_analise_qualidade_por_app.png': ('Gráfico 1: Análise de Qualidade', gerar_grafico_1_analise_qualidade,
+                                         ['por_app', 'app_sentimento']),
+    '02_correlacao_tamanho_score.png': ('Gráfico 2: Correlação Tamanho-Score', gerar_grafico_2_correlacao_tamanho_score,
+                                        ['tamanho', 'densidade', 'regressao']),
+    '03_categorizacao_inteligente.png': ('Gráfico 3: Categorização Inteligente', gerar_grafico_3_categorizacao_inteligente,
+                                         ['categoria']),
+    '04_deteccao_anomalias.png': ('Gráfico 4: Detecção de Anomalias', gerar_grafico_4_deteccao_anomalias,
+                                  ['app_score', 'amostra']),
+    '05_ranking_comparativo.png': ('Gráfico 5: Ranking Comparativo', gerar_grafico_5_ranking_comparativo,
+                                   ['ranking']),
+}
 
-def main():
+
+def _renderizar(arquivo, dados):
+    """Executado no processo filho: desenha e salva um gráfico"""
+    GRAFICOS[arquivo][1](dados)
+    return arquivo
+
+
+def main(argv=None):
     """Função principal"""
+    parser = argparse.ArgumentParser(description='Gera os gráficos das análises melhoradas.')
+    parser.add_argument('--forcar', action='store_true', help='redesenha mesmo sem mudança nos dados')
+    parser.add_argument('--workers', type=int, default=None, help='processos de renderização')
+    parser.add_argument('--parquet', nargs='?', const=snapshot_path, default=None,
+                        help='lê o snapshot Parquet (snapshot_parquet.py) em vez do SQLite')
+    args = parser.parse_args(argv)
+
     print("Gerando gráficos das análises melhoradas...")
     
     # Conectar ao banco ou criar dados simulados
-    conn = conectar_sqlite()
-    if conn:
-        # Tentar ler dados do SQLite
-        try:
-            df = pd.read_sql_query("""
-                SELECT a.nome as app, r.score, r.word_count, r.char_count, 
-                       r.has_noise, r.sentiment_label, r.model_sentiment
-                FROM Reviews r
-                JOIN Aplicativos a ON r.id_app = a.id_app
-                WHERE r.word_count IS NOT NULL
-            """, conn)
-            conn.close()
-        except:
-            print("Usando dados simulados...")
-            df = criar_dados_simulados()
+    dados = None
+    if args.parquet:
+        dados = carregar_agregados_dataframe(base_parquet(args.parquet))
     else:
+        conn = conectar_sqlite()
+        if conn:
+            # Erros daqui em diante são bugs, não falta de dados: não caem nos simulados
+            dados = carregar_agregados(conn, base_sqlite(conn))
+            conn.close()
+            if dados['por_app'].empty:
+                dados = None
+    if dados is None:
         print("Usando dados simulados...")
-        df = criar_dados_simulados()
+        dados = carregar_agregados_dataframe(base_dataframe(criar_dados_simulados()))
+    relatorio_memoria('agregados', dados)
     
     # Criar diretório se não existir
-    Path('../dashboard_bi').mkdir(exist_ok=True)
-    
-    # Gerar gráficos
-    print("Gerando Gráfico 1: Análise de Qualidade...")
-    gerar_grafico_1_analise_qualidade(df)
-    
-    print("Gerando Gráfico 2: Correlação Tamanho-Score...")
-    gerar_grafico_2_correlacao_tamanho_score(df)
-    
-    print("Gerando Gráfico 3: Categorização Inteligente...")
-    gerar_grafico_3_categorizacao_inteligente(df)
-    
-    print("Gerando Gráfico 4: Detecção de Anomalias...")
-    gerar_grafico_4_deteccao_anomalias(df)
-    
-    print("Gerando Gráfico 5: Ranking Comparativo...")
-    gerar_grafico_5_ranking_comparativo(df)
+    Path(PASTA_GRAFICOS).mkdir(exist_ok=True)
+    
+    # Só redesenha os gráficos cujos agregados mudaram
+    pendentes = {}
+    for arquivo, (descricao, _, chaves) in GRAFICOS.items():
+        dados_grafico = {chave: dados[chave] for chave in chaves}
+        if not args.forcar and impressao_salva(arquivo) == impressao_digital(arquivo, dados_grafico):
+            print(f"{descricao}: sem mudanças, mantido")
+            continue
+        pendentes[arquivo] = dados_grafico
+    
+    # Gerar gráficos em paralelo
+    if pendentes:
+        with ProcessPoolExecutor(max_workers=args.workers or min(len(pendentes), os.cpu_count() or 1)) as pool:
+            futuros = [pool.submit(_renderizar, arquivo, d) for arquivo, d in pendentes.items()]
+            for futuro in futuros:
+                print(f"Gerado {GRAFICOS[futuro.result()][0]}")
+    relatorio_memoria('renderização')
     
     print("Gráficos gerados com sucesso!")
-    print("Arquivos salvos em: ../dashboard_bi/")
+    print(f"Arquivos salvos em: {PASTA_GRAFICOS}/")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
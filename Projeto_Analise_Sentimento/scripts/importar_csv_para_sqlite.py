@@ -1,36 +1,421 @@
-import pandas as pd
+"""
+Importação em lote do CSV de reviews para o SQLite.
+
+O CSV é lido em blocos de tamanho fixo (memória limitada), os IDs dos
+aplicativos são resolvidos uma única vez por nome (dimensoes.py) e cada bloco é gravado com
+`executemany` dentro de uma transação própria. O número de linhas já gravadas
+fica registrado em `Controle_Importacao`, na mesma transação do bloco, para
+que uma importação interrompida possa ser retomada do último bloco confirmado.
+
+No modo incremental (`--incremental`) as reviews são deduplicadas por
+`review_uuid` (índice único): linhas já existentes são ignoradas ou
+atualizadas apenas quando mudaram, e a leitura começa na marca d'água do
+arquivo (linhas já importadas), desde que o arquivo só tenha crescido.
+
+As métricas de texto (`char_count`, `word_count`, `has_noise`) e os rótulos
+de sentimento são gravados na mesma passada; quando o CSV não traz alguma
+dessas colunas ela é calculada a partir de `content`/`score`. Os índices
+`idx_reviews_*` só são criados depois da carga. Na carga completa os
+triggers dos agregados por app (agregados.py) também saem durante a carga e
+`resumo_app` é recalculada uma única vez no final. Se a tabela `anomalias`
+existir (anomalias.py), ela é regravada ao final de toda carga.
+"""
+
+import argparse
+import hashlib
+import os
+import re
 import sqlite3
+import time
+
+import pandas as pd
 from tqdm import tqdm
 
+from agregados import agregados_instalados, reconstruir_agregados, remover_gatilhos
+from anomalias import anomalias_instaladas, gravar_anomalias
+from dimensoes import dimensao
+from instrumentacao import etapa, medido, pico_memoria_mb
+
 # Caminhos
-csv_path = 'Projeto_Analise_Sentimento/dados_fonte/mensageiros_processado.csv'
-db_path = 'Projeto_Analise_Sentimento/banco_de_dados_sqlite/database.db'
-
-# Ler CSV
-print('Lendo CSV...')
-df = pd.read_csv(csv_path)
-
-# Conectar ao SQLite
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-# Popular Aplicativos (sem duplicatas)
-apps = df['app'].drop_duplicates().reset_index(drop=True)
-app_id_map = {}
-print('Populando tabela Aplicativos...')
-for nome in tqdm(apps):
-    cursor.execute('INSERT OR IGNORE INTO Aplicativos (nome) VALUES (?)', (nome,))
-    cursor.execute('SELECT id_app FROM Aplicativos WHERE nome = ?', (nome,))
-    app_id_map[nome] = cursor.fetchone()[0]
-
-# Popular Reviews
-print('Populando tabela Reviews...')
-for _, row in tqdm(df.iterrows(), total=len(df)):
-    cursor.execute(
-        'INSERT INTO Reviews (review_uuid, score, id_app) VALUES (?, ?, ?)',
-        (row['reviewId'], row['score'], app_id_map[row['app']])
-    )
-
-conn.commit()
-conn.close()
-print('Importação concluída!') 
\ No newline at end of file
+script_dir = os.path.dirname(os.path.abspath(__file__))
+csv_path = os.path.abspath(os.path.join(script_dir, '../dados_fonte/mensageiros_processado.csv'))
+db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+
+TAMANHO_BLOCO = 50_000
+
+# Colunas do CSV realmente usadas (as demais nem chegam a ser carregadas)
+COLUNAS_CSV = ['reviewId', 'score', 'app']
+COLUNAS_METRICAS = ['char_count', 'word_count', 'has_noise', 'sentiment_label', 'model_sentiment']
+
+# Colunas adicionadas por melhorias_avaliacao.sql (criadas aqui se faltarem)
+TIPOS_COLUNAS_METRICAS = {
+    'char_count': 'INTEGER',
+    'word_count': 'INTEGER',
+    'has_noise': 'BOOLEAN',
+    'sentiment_label': 'VARCHAR(20)',
+    'model_sentiment': 'VARCHAR(20)',
+}
+
+INDICES_REVIEWS = [
+    'CREATE INDEX IF NOT EXISTS idx_reviews_word_count ON Reviews(word_count)',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_has_noise ON Reviews(has_noise)',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_sentiment ON Reviews(sentiment_label)',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_char_count ON Reviews(char_count)',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_score ON Reviews(score)',
+]
+
+# Caracteres fora de letras, números e pontuação comum (emojis, símbolos...).
+# Compilado com `re`: \w inclui letras acentuadas (no RE2 das strings Arrow, não)
+PADRAO_RUIDO = re.compile(r"[^\w\s.,;:!?'\"()\-]")
+
+COLUNAS_REVIEW = ['review_uuid', 'score', 'id_app'] + COLUNAS_METRICAS
+
+SQL_INSERIR_REVIEW = (
+    f"INSERT INTO Reviews ({', '.join(COLUNAS_REVIEW)}) "
+    f"VALUES ({', '.join('?' * len(COLUNAS_REVIEW))})"
+)
+
+# Modo incremental: o que fazer quando o review_uuid já existe.
+# model_sentiment nulo no CSV não apaga um rótulo já gravado pelo modelo.
+_ATUALIZAVEIS = COLUNAS_REVIEW[1:]
+SQL_INSERIR_IGNORAR = SQL_INSERIR_REVIEW + ' ON CONFLICT(review_uuid) DO NOTHING'
+SQL_INSERIR_ATUALIZAR = SQL_INSERIR_REVIEW + '''
+    ON CONFLICT(review_uuid) DO UPDATE SET
+        {atribuicoes}
+    WHERE {diferencas}
+'''.format(
+    atribuicoes=',\n        '.join(
+        f'{c} = COALESCE(excluded.{c}, {c})' if c == 'model_sentiment' else f'{c} = excluded.{c}'
+        for c in _ATUALIZAVEIS
+    ),
+    diferencas=' OR '.join(
+        f'COALESCE(excluded.{c}, {c}) IS NOT {c}' if c == 'model_sentiment' else f'{c} IS NOT excluded.{c}'
+        for c in _ATUALIZAVEIS
+    ),
+)
+
+BYTES_ASSINATURA = 1024 * 1024
+
+
+def configurar_conexao(conn, synchronous='NORMAL'):
+    """Ajusta os PRAGMAs do SQLite para carga em lote"""
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA synchronous = {synchronous}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA cache_size = -65536')  # ~64 MB
+
+
+def criar_tabela_controle(conn):
+    """Cria a tabela que guarda o progresso da importação por arquivo"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS Controle_Importacao (
+            arquivo TEXT PRIMARY KEY,
+            linhas_processadas INTEGER NOT NULL DEFAULT 0,
+            concluido INTEGER NOT NULL DEFAULT 0,
+            tamanho_bytes INTEGER,
+            assinatura TEXT,
+            atualizado_em TEXT
+        )
+    ''')
+    # Bancos criados antes da marca d'água não têm as colunas novas
+    colunas = {row[1] for row in conn.execute('PRAGMA table_info(Controle_Importacao)')}
+    for coluna, tipo in [('tamanho_bytes', 'INTEGER'), ('assinatura', 'TEXT')]:
+        if coluna not in colunas:
+            conn.execute(f'ALTER TABLE Controle_Importacao ADD COLUMN {coluna} {tipo}')
+    conn.commit()
+
+
+def ler_checkpoint(conn, arquivo):
+    """Retorna (linhas_processadas, concluido, tamanho_bytes, assinatura) do arquivo"""
+    row = conn.execute(
+        'SELECT linhas_processadas, concluido, tamanho_bytes, assinatura '
+        'FROM Controle_Importacao WHERE arquivo = ?',
+        (arquivo,)
+    ).fetchone()
+    return (row[0], bool(row[1]), row[2], row[3]) if row else (0, False, None, None)
+
+
+def gravar_checkpoint(conn, arquivo, linhas, concluido=False, tamanho_bytes=None, assinatura=None):
+    """Registra o progresso (deve rodar na mesma transação do bloco)"""
+    conn.execute('''
+        INSERT INTO Controle_Importacao
+            (arquivo, linhas_processadas, concluido, tamanho_bytes, assinatura, atualizado_em)
+        VALUES (?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(arquivo) DO UPDATE SET
+            linhas_processadas = excluded.linhas_processadas,
+            concluido = excluded.concluido,
+            tamanho_bytes = COALESCE(excluded.tamanho_bytes, tamanho_bytes),
+            assinatura = COALESCE(excluded.assinatura, assinatura),
+            atualizado_em = excluded.atualizado_em
+    ''', (arquivo, linhas, int(concluido), tamanho_bytes, assinatura))
+
+
+def assinatura_arquivo(caminho, limite_bytes):
+    """SHA-1 do início do arquivo (detecta arquivos reescritos em vez de estendidos)"""
+    with open(caminho, 'rb') as f:
+        return hashlib.sha1(f.read(min(limite_bytes, BYTES_ASSINATURA))).hexdigest()
+
+
+def arquivo_so_cresceu(caminho, tamanho_anterior, assinatura_anterior):
+    """Indica se o arquivo atual é o anterior com linhas acrescentadas ao final"""
+    if tamanho_anterior is None or assinatura_anterior is None:
+        return False
+    if os.path.getsize(caminho) < tamanho_anterior:
+        return False
+    return assinatura_arquivo(caminho, tamanho_anterior) == assinatura_anterior
+
+
+def garantir_colunas_reviews(conn):
+    """Adiciona a Reviews as colunas de métricas que ainda não existirem"""
+    existentes = {row[1] for row in conn.execute('PRAGMA table_info(Reviews)')}
+    for coluna, tipo in TIPOS_COLUNAS_METRICAS.items():
+        if coluna not in existentes:
+            conn.execute(f'ALTER TABLE Reviews ADD COLUMN {coluna} {tipo}')
+    conn.commit()
+
+
+def tem_indice_uuid(conn):
+    """Indica se Reviews já tem o índice único de review_uuid"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_reviews_uuid'"
+    ).fetchone() is not None
+
+
+def garantir_indice_uuid(conn):
+    """Cria o índice único em review_uuid, removendo duplicatas antigas antes"""
+    if tem_indice_uuid(conn):
+        return
+    with conn:
+        removidas = conn.execute('''
+            DELETE FROM Reviews
+            WHERE id_review_sqlite NOT IN (
+                SELECT MIN(id_review_sqlite) FROM Reviews GROUP BY review_uuid
+            )
+        ''').rowcount
+        if removidas:
+            print(f'{removidas} reviews duplicadas removidas (mantida a primeira de cada review_uuid)')
+        conn.execute('CREATE UNIQUE INDEX idx_reviews_uuid ON Reviews(review_uuid)')
+
+
+def remover_indices_reviews(conn):
+    """Remove os índices secundários de Reviews e devolve o DDL para recriá-los"""
+    # O índice único de review_uuid fica: sem ele não há deduplicação
+    indices = conn.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = 'Reviews' AND sql IS NOT NULL "
+        "AND name != 'idx_reviews_uuid'"
+    ).fetchall()
+    for nome, _ in indices:
+        conn.execute(f'DROP INDEX IF EXISTS "{nome}"')
+    conn.commit()
+    return [sql for _, sql in indices]
+
+
+def recriar_indices(conn, ddls):
+    """Recria os índices depois da carga (uma ordenação por índice)"""
+    for ddl in ddls:
+        conn.execute(ddl)
+    for ddl in INDICES_REVIEWS:
+        conn.execute(ddl)
+    conn.commit()
+
+
+def colunas_a_ler(caminho_csv):
+    """Colunas do CSV a carregar: as fixas, as métricas presentes e o texto se faltar alguma"""
+    cabecalho = set(pd.read_csv(caminho_csv, nrows=0).columns)
+    colunas = COLUNAS_CSV + [c for c in COLUNAS_METRICAS if c in cabecalho]
+    faltando_texto = {'char_count', 'word_count', 'has_noise'} - cabecalho
+    if faltando_texto and 'content' in cabecalho:
+        colunas.append('content')
+    return colunas
+
+
+def rotulo_por_score(score):
+    """Sentimento derivado da nota: 4-5 positivo, 1-2 negativo, 3 neutro"""
+    rotulo = pd.Series('neutro', index=score.index, dtype=object)
+    rotulo[score >= 4] = 'positivo'
+    rotulo[score <= 2] = 'negativo'
+    rotulo[score.isna()] = None
+    return rotulo
+
+
+def normalizar_booleano(serie):
+    """Converte True/False, 'true'/'false' e 0/1 para 0/1 (nulos preservados)"""
+    if serie.dtype == bool:
+        return serie.astype(int)
+    texto = serie.astype(str).str.strip().str.lower()
+    return texto.map({'true': 1, 'false': 0, '1': 1, '0': 0, '1.0': 1, '0.0': 0})
+
+
+def marcar_ruido(texto):
+    """1 para textos com caracteres fora de PADRAO_RUIDO, 0 para os demais, nulo sem texto
+
+    >>> marcar_ruido(pd.Series(['Péssimo, não funciona', 'ótimo app', 'top 👍', None])).tolist()
+    [0, 0, 1, <NA>]
+    """
+    # dtype object: o pandas 3 usaria o RE2 (sem Unicode em \w) nas strings Arrow
+    return texto.astype(object).str.contains(PADRAO_RUIDO).astype('Int64')
+
+
+def completar_metricas(bloco):
+    """Preenche (vetorizado) as métricas ausentes no CSV a partir do texto e do score"""
+    bloco = bloco.copy()
+    if 'content' in bloco:
+        # Sem texto, as métricas ficam nulas (não uma review de tamanho zero)
+        texto = bloco['content'].astype(object)
+        texto = texto.where(texto.isna(), texto.astype(str))
+        if 'char_count' not in bloco:
+            bloco['char_count'] = texto.str.len().astype('Int64')
+        if 'word_count' not in bloco:
+            bloco['word_count'] = texto.str.split().str.len().astype('Int64')
+        if 'has_noise' not in bloco:
+            bloco['has_noise'] = marcar_ruido(texto)
+    if 'has_noise' in bloco:
+        bloco['has_noise'] = normalizar_booleano(bloco['has_noise'])
+    if 'sentiment_label' not in bloco:
+        bloco['sentiment_label'] = rotulo_por_score(bloco['score'])
+    # model_sentiment vem do modelo: sem a coluna no CSV fica nulo
+    for coluna in COLUNAS_METRICAS:
+        if coluna not in bloco:
+            bloco[coluna] = None
+    return bloco
+
+
+def valores(serie):
+    """Lista de valores Python com NaN convertido em None"""
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+def linhas_do_bloco(bloco, app_id_map):
+    """Converte o bloco em tuplas prontas para o executemany"""
+    bloco = completar_metricas(bloco)
+    colunas = [valores(bloco['reviewId']), valores(bloco['score']), valores(bloco['app'].map(app_id_map))]
+    colunas += [valores(bloco[c]) for c in COLUNAS_METRICAS]
+    return list(zip(*colunas))
+
+
+def ler_blocos(caminho_csv, tamanho_bloco, pular=0, colunas=None):
+    """Lê o CSV em blocos a partir da linha de dados `pular`"""
+    colunas = colunas or colunas_a_ler(caminho_csv)
+    opcoes = {}
+    if pular:
+        # Na retomada o tokenizador só passa pelos registros já importados
+        # (respeitando quebras de linha entre aspas), sem convertê-los em
+        # blocos; o cabeçalho, pulado junto, vira `names`
+        nomes = list(pd.read_csv(caminho_csv, nrows=0).columns)
+        opcoes = {'skiprows': pular + 1, 'header': None, 'names': nomes}
+    leitor = pd.read_csv(caminho_csv, usecols=colunas, chunksize=tamanho_bloco, **opcoes)
+    while True:
+        with etapa('leitura_csv', perfil=False) as medida:
+            bloco = next(leitor, None)
+            medida['linhas'] = 0 if bloco is None else len(bloco)
+        if bloco is None:
+            break
+        if len(bloco):  # pular além do fim rende um bloco vazio
+            yield bloco
+
+
+@medido('importar')
+def importar(caminho_csv=csv_path, caminho_db=db_path, tamanho_bloco=TAMANHO_BLOCO,
+             synchronous='NORMAL', reiniciar=False, incremental=False, atualizar=True):
+    """Importa o CSV em blocos, retomando do último checkpoint quando houver"""
+    conn = sqlite3.connect(caminho_db)
+    configurar_conexao(conn, synchronous)
+    criar_tabela_controle(conn)
+    garantir_colunas_reviews(conn)
+
+    arquivo = os.path.basename(caminho_csv)
+    ja_processadas, concluido, tamanho_anterior, assinatura_anterior = ler_checkpoint(conn, arquivo)
+    if incremental:
+        # Marca d'água: só vale se o arquivo foi apenas estendido
+        if concluido and not arquivo_so_cresceu(caminho_csv, tamanho_anterior, assinatura_anterior):
+            ja_processadas = 0
+        sql_inserir = SQL_INSERIR_ATUALIZAR if atualizar else SQL_INSERIR_IGNORAR
+    else:
+        if concluido:
+            ja_processadas = 0
+        # Depois do primeiro modo incremental, a carga completa também não duplica
+        sql_inserir = SQL_INSERIR_IGNORAR if tem_indice_uuid(conn) else SQL_INSERIR_REVIEW
+    if reiniciar:
+        ja_processadas = 0
+    if ja_processadas:
+        print(f'Retomando importação a partir da linha {ja_processadas}...')
+
+    if incremental:
+        # Carga pequena sobre tabela grande: manter os índices é mais barato
+        garantir_indice_uuid(conn)
+        ddls_indices = []
+    else:
+        # Índices e triggers de agregados só atrapalham a carga: refeitos ao final
+        ddls_indices = remover_indices_reviews(conn)
+        if agregados_instalados(conn):
+            remover_gatilhos(conn)
+    apps = dimensao(conn, 'apps')
+    alteradas = 0
+
+    print('Populando tabela Reviews...')
+    inicio = time.perf_counter()
+    inseridas = 0
+    total = ja_processadas
+    with tqdm(unit=' linhas', initial=ja_processadas) as barra:
+        for bloco in ler_blocos(caminho_csv, tamanho_bloco, pular=ja_processadas):
+            with conn:
+                with etapa('apps', perfil=False):
+                    apps.resolver(conn, bloco['app'].unique())
+                with etapa('insercao', linhas=len(bloco), perfil=False):
+                    alteradas += conn.executemany(sql_inserir, linhas_do_bloco(bloco, apps.ids)).rowcount
+                total += len(bloco)
+                gravar_checkpoint(conn, arquivo, total)
+            inseridas += len(bloco)
+            barra.update(len(bloco))
+
+    with conn:
+        tamanho = os.path.getsize(caminho_csv)
+        gravar_checkpoint(conn, arquivo, total, concluido=True, tamanho_bytes=tamanho,
+                          assinatura=assinatura_arquivo(caminho_csv, tamanho))
+
+    print('Recriando índices...')
+    with etapa('indices'):
+        recriar_indices(conn, ddls_indices)
+    if not incremental and agregados_instalados(conn):
+        print('Recalculando agregados por app...')
+        reconstruir_agregados(conn)
+    if anomalias_instaladas(conn):
+        print('Recalculando anomalias...')
+        gravar_anomalias(conn)
+    conn.close()
+
+    duracao = time.perf_counter() - inicio
+    taxa = inseridas / duracao if duracao > 0 else 0
+    print(f'{inseridas} linhas em {duracao:.1f}s ({taxa:,.0f} linhas/s)')
+    if incremental:
+        print(f'{alteradas} linhas novas ou alteradas gravadas')
+    pico = pico_memoria_mb()
+    if pico is not None:
+        print(f'Pico de memória: {pico:.0f} MB')
+    return inseridas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importa o CSV de reviews para o SQLite em blocos.')
+    parser.add_argument('--csv', default=csv_path, help='CSV de origem')
+    parser.add_argument('--db', default=db_path, help='banco SQLite de destino')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO,
+                        help='linhas por bloco/transação')
+    parser.add_argument('--synchronous', default='NORMAL', choices=['OFF', 'NORMAL', 'FULL'],
+                        help='PRAGMA synchronous durante a carga')
+    parser.add_argument('--reiniciar', action='store_true',
+                        help='ignora o checkpoint e importa o arquivo do início')
+    parser.add_argument('--incremental', action='store_true',
+                        help="deduplica por review_uuid e lê a partir da marca d'água do arquivo")
+    parser.add_argument('--ignorar-existentes', action='store_true',
+                        help='no modo incremental, não atualiza reviews já existentes')
+    args = parser.parse_args(argv)
+
+    importar(args.csv, args.db, args.tamanho_bloco, args.synchronous, args.reiniciar,
+             args.incremental, not args.ignorar_existentes)
+    print('Importação concluída!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Instrumentação compartilhada dos scripts: tempo, linhas e memória por etapa.
+
+    with etapa('insercao', linhas=len(bloco)):
+        ...
+
+    @medido('categorizacao')
+    def gravar_categorias(conn): ...
+
+Cada etapa concluída vira uma linha JSON no logger
+`analise_sentimento.metricas`, por exemplo:
+
+    {"etapa": "importar/insercao", "segundos": 0.412, "linhas": 50000,
+     "linhas_por_segundo": 121359, "rss_mb": 182.3, "pico_mb": 190.1, "pid": 4242, ...}
+
+O nome inclui as etapas em que ela está aninhada (na mesma thread),
+separadas por '/'. Funções decoradas que retornam um inteiro têm esse valor
+registrado como `linhas`.
+
+Configuração por variáveis de ambiente, herdadas pelos processos filhos:
+- ANALISE_METRICAS: arquivo .jsonl onde as métricas são acrescentadas
+  ('-' para stderr). Sem ela, nada é registrado;
+- ANALISE_PERFIL: pasta onde as etapas com `perfil=True` (o padrão; os lotes
+  usam `perfil=False`) gravam um dump do cProfile, `<etapa>-<pid>-<n>.prof`.
+  Só a etapa mais externa é perfilada. Com ANALISE_PERFILADOR=pyinstrument
+  (se instalado) o dump é um .html do pyinstrument.
+"""
+
+import cProfile
+import functools
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('analise_sentimento.metricas')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+_local = threading.local()
+_contador = itertools.count(1)
+_perfilando = threading.Lock()
+_config = {'pasta_perfil': None, 'perfilador': 'cprofile'}
+
+
+def configurar(arquivo_metricas=None, pasta_perfil=None, perfilador='cprofile'):
+    """Liga o registro das métricas (arquivo .jsonl ou '-') e, opcionalmente, os perfis"""
+    for handler in list(logger.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            logger.removeHandler(handler)
+            handler.close()
+    if arquivo_metricas:
+        if arquivo_metricas == '-':
+            handler = logging.StreamHandler(sys.stderr)
+        else:
+            handler = logging.FileHandler(arquivo_metricas, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    if pasta_perfil:
+        os.makedirs(pasta_perfil, exist_ok=True)
+    _config.update(pasta_perfil=pasta_perfil, perfilador=perfilador)
+
+
+def pico_memoria_mb():
+    """Pico de memória residente do processo (MB), quando disponível"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def pico_memoria_filhos_mb():
+    """Maior pico de memória entre os processos filhos já encerrados (MB)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def rss_mb():
+    """Memória residente atual (MB); sem /proc, o pico"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return pico_memoria_mb()
+
+
+def _pilha():
+    if not hasattr(_local, 'pilha'):
+        _local.pilha = []
+    return _local.pilha
+
+
+@contextmanager
+def _perfil(nome, ativo):
+    """Perfila o bloco se pedido, configurado e nenhum outro perfil estiver ativo"""
+    if not (ativo and _config['pasta_perfil'] and _perfilando.acquire(blocking=False)):
+        yield
+        return
+    arquivo = re.sub(r'[^\w.-]+', '_', nome)
+    base = os.path.join(_config['pasta_perfil'], f'{arquivo}-{os.getpid()}-{next(_contador)}')
+    try:
+        if _config['perfilador'] == 'pyinstrument':
+            from pyinstrument import Profiler
+            perfilador = Profiler()
+            perfilador.start()
+            try:
+                yield
+            finally:
+                perfilador.stop()
+                with open(base + '.html', 'w', encoding='utf-8') as f:
+                    f.write(perfilador.output_html())
+        else:
+            perfilador = cProfile.Profile()
+            perfilador.enable()
+            try:
+                yield
+            finally:
+                perfilador.disable()
+                perfilador.dump_stats(base + '.prof')
+    finally:
+        _perfilando.release()
+
+
+@contextmanager
+def etapa(nome, linhas=None, perfil=True, **campos):
+    """Mede o bloco; o dicionário devolvido aceita `linhas` e outros campos preenchidos dentro dele"""
+    pilha = _pilha()
+    pilha.append(nome)
+    caminho = '/'.join(pilha)
+    medida = dict(campos, linhas=linhas)
+    inicio = time.perf_counter()
+    try:
+        with _perfil(caminho, perfil):
+            yield medida
+    finally:
+        segundos = time.perf_counter() - inicio
+        pilha.pop()
+        if logger.isEnabledFor(logging.INFO):
+            n = medida.get('linhas')
+            registro = {
+                'etapa': caminho,
+                'segundos': round(segundos, 4),
+                **medida,
+                'linhas_por_segundo': round(n / segundos) if n and segundos > 0 else None,
+                'rss_mb': round(rss_mb() or 0, 1),
+                'pico_mb': round(pico_memoria_mb() or 0, 1),
+                'pid': os.getpid(),
+                'momento': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+            logger.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+
+def medido(nome=None, perfil=True):
+    """Decorador: mede cada chamada da função como uma etapa"""
+    def decorador(funcao):
+        rotulo = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with etapa(rotulo, perfil=perfil) as medida:
+                resultado = funcao(*args, **kwargs)
+                if isinstance(resultado, int) and not isinstance(resultado, bool):
+                    medida['linhas'] = resultado
+                return resultado
+        return envolvida
+    return decorador
+
+
+configurar(os.environ.get('ANALISE_METRICAS'), os.environ.get('ANALISE_PERFIL'),
+           os.environ.get('ANALISE_PERFILADOR', 'cprofile'))
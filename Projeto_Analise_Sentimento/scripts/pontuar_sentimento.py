@@ -0,0 +1,207 @@
+"""
+Pontuação offline de sentimento: preenche `Reviews.model_sentiment`.
+
+O texto não fica no SQLite, então ele é lido do CSV fonte (`reviewId`,
+`content`) em blocos e cada bloco é pontuado por um pool de processos (no
+máximo 2 blocos por worker em andamento). O modelo é um léxico ponderado
+(EN/PT embutido, ou `--lexico palavra,peso`) aplicado de forma vetorizada:
+
+    tokens (PADRAO_PALAVRA, minúsculas) -> peso do léxico -> sinal invertido
+    quando a palavra anterior é uma negação -> soma por review
+
+Soma positiva vira 'positivo', negativa 'negativo' e zero 'neutro' (mesmos
+rótulos de sentiment_label).
+
+Os rótulos voltam na ordem dos blocos e são gravados com `executemany`
+(UPDATE por review_uuid, só quando o rótulo muda, para não gerar CDC à toa),
+na mesma transação do checkpoint em `Controle_Importacao`. A chave do
+checkpoint inclui a versão do léxico: uma execução interrompida retoma do
+último bloco gravado, e trocar o léxico repontua o corpus inteiro. Como na
+importação incremental, um CSV que só cresceu é pontuado a partir da marca
+d'água.
+
+Os triggers dos agregados por app saem durante a gravação e `resumo_app`
+(sentimentos_concordantes) é recalculada uma vez no final.
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from agregados import GATILHOS, agregados_instalados, instalar_agregados, reconstruir_resumo_app, remover_gatilhos
+from frequencia_palavras import PADRAO_PALAVRA
+from importar_csv_para_sqlite import (arquivo_so_cresceu, assinatura_arquivo, configurar_conexao,
+                                      criar_tabela_controle, garantir_colunas_reviews, gravar_checkpoint,
+                                      ler_blocos, ler_checkpoint, tem_indice_uuid)
+from instrumentacao import etapa, medido
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+csv_path = os.path.abspath(os.path.join(script_dir, '../dados_fonte/mensageiros_processado.csv'))
+db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+
+TAMANHO_BLOCO = 50_000
+COLUNAS_CSV = ['reviewId', 'content']
+
+LEXICO_PADRAO = {
+    # en
+    'good': 1, 'great': 2, 'excellent': 3, 'amazing': 3, 'awesome': 3, 'love': 2, 'loved': 2,
+    'like': 1, 'best': 2, 'nice': 1, 'perfect': 3, 'easy': 1, 'fast': 1, 'useful': 1, 'helpful': 1,
+    'happy': 2, 'recommend': 2, 'reliable': 2, 'smooth': 1, 'clear': 1, 'fine': 1, 'thanks': 1,
+    'thank': 1, 'cool': 1, 'wonderful': 3, 'fantastic': 3, 'works': 1, 'working': 1,
+    'bad': -2, 'worst': -3, 'terrible': -3, 'horrible': -3, 'awful': -3, 'hate': -3, 'poor': -2,
+    'useless': -3, 'slow': -1, 'crash': -2, 'crashes': -2, 'crashing': -2, 'bug': -1, 'bugs': -1,
+    'buggy': -2, 'error': -1, 'problem': -1, 'problems': -1, 'issue': -1, 'issues': -1, 'fix': -1,
+    'annoying': -2, 'disappointed': -2, 'disappointing': -2, 'broken': -2, 'fail': -2, 'fails': -2,
+    'failed': -2, 'waste': -2, 'lag': -1, 'laggy': -2, 'freeze': -2, 'freezes': -2, 'stuck': -1,
+    'spam': -2, 'ads': -1, 'unable': -1, 'cannot': -1, "can't": -1, 'uninstall': -2, 'uninstalled': -2,
+    # pt
+    'bom': 1, 'boa': 1, 'ótimo': 2, 'ótima': 2, 'excelente': 3, 'maravilhoso': 3, 'adoro': 2,
+    'amei': 2, 'gosto': 1, 'melhor': 2, 'perfeito': 3, 'fácil': 1, 'rápido': 1, 'útil': 1,
+    'recomendo': 2, 'legal': 1, 'obrigado': 1, 'funciona': 1,
+    'ruim': -2, 'péssimo': -3, 'péssima': -3, 'horrível': -3, 'odeio': -3, 'pior': -3,
+    'inútil': -3, 'lento': -1, 'trava': -2, 'travando': -2, 'erro': -1, 'problema': -1,
+    'problemas': -1, 'falha': -2, 'decepcionante': -2, 'lixo': -3,
+}
+
+# A palavra seguinte a uma negação conta com o sinal invertido ("not good")
+NEGACOES = frozenset('''
+    not no never dont don't doesnt doesn't didnt didn't isnt isn't wasnt wasn't wont won't
+    cant can't couldnt couldn't nothing não nao nunca nem sem
+'''.split())
+
+SQL_ATUALIZAR = '''
+    UPDATE Reviews SET model_sentiment = ?1
+    WHERE review_uuid = ?2 AND model_sentiment IS NOT ?1
+'''
+
+
+def carregar_lexico(arquivo=None):
+    """Léxico palavra -> peso: o embutido ou um CSV com colunas palavra,peso"""
+    if not arquivo:
+        return dict(LEXICO_PADRAO)
+    tabela = pd.read_csv(arquivo, usecols=['palavra', 'peso'])
+    return dict(zip(tabela['palavra'].str.lower(), tabela['peso'].astype(float)))
+
+
+def versao_lexico(lexico):
+    """Hash curto do léxico (entra na chave do checkpoint)"""
+    conteudo = '\n'.join(f'{palavra}\t{float(peso)!r}' for palavra, peso in sorted(lexico.items()))
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:12]
+
+
+def pontuar_textos(textos, lexico, negacoes=NEGACOES):
+    """Rótulo de cada texto pela soma dos pesos do léxico, em uma passada vetorizada"""
+    textos = pd.Series(textos, dtype=object).fillna('').astype(str)
+    tokens = textos.str.lower().str.replace('’', "'").str.findall(PADRAO_PALAVRA).explode()
+    pesos = tokens.map(lexico).astype(float).fillna(0.0)
+    negada = tokens.groupby(level=0).shift().isin(negacoes)
+    pesos = pesos.where(~negada, -pesos)
+    soma = pesos.groupby(level=0).sum().reindex(textos.index, fill_value=0.0).to_numpy()
+    return np.select([soma > 0, soma < 0], ['positivo', 'negativo'], 'neutro').tolist()
+
+
+_lexico = None
+
+
+def _iniciar_worker(lexico):
+    global _lexico
+    _lexico = lexico
+
+
+def pontuar_bloco(uuids, textos):
+    """Worker: (rótulo, review_uuid) de cada review do bloco"""
+    return list(zip(pontuar_textos(textos, _lexico), uuids))
+
+
+@medido('pontuacao_sentimento')
+def pontuar(caminho_csv=csv_path, caminho_db=db_path, lexico=None, workers=None,
+            tamanho_bloco=TAMANHO_BLOCO, reiniciar=False):
+    """Pontua o CSV e grava model_sentiment; retorna o número de reviews pontuadas"""
+    lexico = lexico or carregar_lexico()
+    workers = workers or os.cpu_count() or 1
+    conn = sqlite3.connect(caminho_db)
+    configurar_conexao(conn)
+    criar_tabela_controle(conn)
+    garantir_colunas_reviews(conn)
+    # O UPDATE é por review_uuid: sem índice, cada linha seria uma varredura de Reviews
+    if not tem_indice_uuid(conn):
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_reviews_review_uuid ON Reviews(review_uuid)')
+
+    chave = f'{os.path.basename(caminho_csv)}#sentimento:{versao_lexico(lexico)}'
+    ja_processadas, concluido, tamanho_anterior, assinatura_anterior = ler_checkpoint(conn, chave)
+    if reiniciar or (concluido and not arquivo_so_cresceu(caminho_csv, tamanho_anterior, assinatura_anterior)):
+        ja_processadas = 0
+    if ja_processadas:
+        print(f'Retomando pontuação a partir da linha {ja_processadas}...')
+
+    gatilhos = agregados_instalados(conn)
+    if gatilhos:
+        # Só os de resumo_app: model_sentiment não muda resumo_app_categoria
+        remover_gatilhos(conn, GATILHOS)
+
+    total = ja_processadas
+    pontuadas = alteradas = 0
+    inicio = time.perf_counter()
+
+    def gravar(futuro, barra):
+        nonlocal total, pontuadas, alteradas
+        rotulos = futuro.result()
+        with conn, etapa('gravacao', linhas=len(rotulos), perfil=False):
+            alteradas += conn.executemany(SQL_ATUALIZAR, rotulos).rowcount
+            total += len(rotulos)
+            gravar_checkpoint(conn, chave, total)
+        pontuadas += len(rotulos)
+        barra.update(len(rotulos))
+
+    try:
+        pendentes = deque()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker, initargs=(lexico,)) as pool, \
+                tqdm(unit=' reviews', initial=ja_processadas) as barra:
+            for bloco in ler_blocos(caminho_csv, tamanho_bloco, pular=ja_processadas, colunas=COLUNAS_CSV):
+                if len(pendentes) >= 2 * workers:
+                    gravar(pendentes.popleft(), barra)
+                pendentes.append(pool.submit(pontuar_bloco, bloco['reviewId'].tolist(), bloco['content'].tolist()))
+            # Em ordem: o checkpoint só avança sobre blocos contíguos
+            while pendentes:
+                gravar(pendentes.popleft(), barra)
+        with conn:
+            tamanho = os.path.getsize(caminho_csv)
+            gravar_checkpoint(conn, chave, total, concluido=True, tamanho_bytes=tamanho,
+                              assinatura=assinatura_arquivo(caminho_csv, tamanho))
+    finally:
+        if gatilhos:
+            print('Recalculando agregados por app...')
+            instalar_agregados(conn)
+            reconstruir_resumo_app(conn)
+        conn.close()
+
+    duracao = time.perf_counter() - inicio
+    taxa = pontuadas / duracao if duracao > 0 else 0
+    print(f'{pontuadas} reviews pontuadas em {duracao:.1f}s ({taxa:,.0f} reviews/s), '
+          f'{alteradas} rótulos alterados')
+    return pontuadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pontua o sentimento das reviews e grava model_sentiment.')
+    parser.add_argument('--csv', default=csv_path, help='CSV fonte (reviewId, content)')
+    parser.add_argument('--db', default=db_path, help='banco SQLite')
+    parser.add_argument('--lexico', help='CSV palavra,peso (padrão: léxico EN/PT embutido)')
+    parser.add_argument('--workers', type=int, default=None, help='processos de pontuação')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='reviews por bloco/transação')
+    parser.add_argument('--reiniciar', action='store_true', help='ignora o checkpoint e pontua do início')
+    args = parser.parse_args(argv)
+
+    pontuar(args.csv, args.db, carregar_lexico(args.lexico), args.workers, args.tamanho_bloco, args.reiniciar)
+
+
+if __name__ == '__main__':
+    main()
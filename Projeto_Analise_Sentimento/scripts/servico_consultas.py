@@ -0,0 +1,319 @@
+"""
+Serviço HTTP/JSON (somente leitura) sobre as views de análise do SQLite.
+
+    python servico_consultas.py --porta 8050
+
+    GET /views                                   views disponíveis e colunas
+    GET /views/<view>?app=WhatsApp&ordem=-score&limite=50&pagina=2
+    GET /saude
+
+Parâmetros de /views/<view>: qualquer coluna da view como filtro de
+igualdade (valores separados por vírgula viram IN; convertidos pela
+afinidade declarada da coluna, ver `valores_filtro`), `ordem` (coluna, com
+'-' para decrescente), `limite` (padrão 100, máximo 1000) e `pagina` (a
+partir de 1). A resposta traz `total` (linhas que passam nos filtros),
+`linhas` e `versao_dados`.
+
+- As consultas usam um pool de conexões `mode=ro` (query_only) abertas uma
+  vez; o banco é posto em WAL na subida, então leitores não bloqueiam nem
+  são bloqueados pelas cargas.
+- Cada página consultada fica em um cache LRU em memória. Uma conexão
+  sentinela lê `PRAGMA data_version` a cada requisição: qualquer commit de
+  outra conexão (importação, categorização, ETL...) muda o valor, a versão
+  dos dados avança e o cache é esvaziado. Um refresh de dashboard sem carga
+  nova no meio não toca em Reviews.
+"""
+
+import argparse
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+from instrumentacao import etapa
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+
+HOST = '127.0.0.1'
+PORTA = 8050
+CONEXOES = 4
+CAPACIDADE_CACHE = 256
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+VIEWS = ['analise_qualidade_reviews', 'correlacao_metricas', 'detecao_anomalias',
+         'analise_por_categorias', 'ranking_apps']
+
+
+def abrir_leitura(caminho_db):
+    """Conexão somente leitura, usável por qualquer thread (uma de cada vez)"""
+    conn = sqlite3.connect(Path(caminho_db).resolve().as_uri() + '?mode=ro', uri=True,
+                           check_same_thread=False)
+    conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+class PoolConexoes:
+    """Conjunto fixo de conexões de leitura; quem pede espera uma ficar livre"""
+
+    def __init__(self, caminho_db, tamanho=CONEXOES):
+        self.livres = queue.Queue()
+        for _ in range(tamanho):
+            self.livres.put(abrir_leitura(caminho_db))
+
+    @contextmanager
+    def conexao(self):
+        conn = self.livres.get()
+        try:
+            yield conn
+        finally:
+            self.livres.put(conn)
+
+    def fechar(self):
+        while not self.livres.empty():
+            self.livres.get_nowait().close()
+
+
+class VersaoDados:
+    """Contador que avança quando outra conexão confirma mudanças no banco"""
+
+    def __init__(self, caminho_db):
+        self.conn = abrir_leitura(caminho_db)
+        self.lock = threading.Lock()
+        self.ultimo = None
+        self.versao = 0
+
+    def atual(self):
+        with self.lock:
+            valor = self.conn.execute('PRAGMA data_version').fetchone()[0]
+            if valor != self.ultimo:
+                self.ultimo = valor
+                self.versao += 1
+            return self.versao
+
+
+class CacheLRU:
+    """Resultados por chave, descartando os menos usados e tudo de versões antigas"""
+
+    def __init__(self, capacidade=CAPACIDADE_CACHE):
+        self.capacidade = capacidade
+        self.itens = OrderedDict()
+        self.versao = None
+        self.lock = threading.Lock()
+        self.acertos = self.faltas = 0
+
+    def obter(self, versao, chave):
+        with self.lock:
+            if versao != self.versao:
+                self.itens.clear()
+                self.versao = versao
+            if chave in self.itens:
+                self.itens.move_to_end(chave)
+                self.acertos += 1
+                return self.itens[chave]
+            self.faltas += 1
+            return None
+
+    def guardar(self, versao, chave, valor):
+        with self.lock:
+            if versao != self.versao:
+                return
+            self.itens[chave] = valor
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.capacidade:
+                self.itens.popitem(last=False)
+
+
+def afinidade(tipo_declarado):
+    """Afinidade SQLite do tipo declarado: INTEGER, TEXT, REAL, NUMERIC ou '' (nenhuma)"""
+    tipo = tipo_declarado.upper()
+    if 'INT' in tipo:
+        return 'INTEGER'
+    if any(t in tipo for t in ('CHAR', 'CLOB', 'TEXT')):
+        return 'TEXT'
+    if not tipo or 'BLOB' in tipo:
+        return ''
+    if any(t in tipo for t in ('REAL', 'FLOA', 'DOUB')):
+        return 'REAL'
+    return 'NUMERIC'
+
+
+def numero(valor):
+    """Texto da URL -> int ou float finito; None se não for um número (inf e nan não são)"""
+    for tipo in (int, float):
+        try:
+            convertido = tipo(valor)
+        except ValueError:
+            continue
+        return convertido if math.isfinite(convertido) else None
+    return None
+
+
+def valores_filtro(coluna, afinidade_coluna, valor):
+    """Valores a comparar com a coluna (as views comparam pelo tipo, sem conversão)
+
+    Colunas de texto recebem o texto como veio ('99' é um nome de app válido);
+    numéricas, só números finitos. Colunas calculadas não têm tipo declarado:
+    o texto e, se for um número, também o número.
+    """
+    if afinidade_coluna == 'TEXT':
+        return [valor]
+    convertido = numero(valor)
+    if afinidade_coluna:
+        if convertido is None:
+            raise ValueError(f'Valor não numérico para {coluna}: {valor}')
+        return [convertido]
+    return [valor] if convertido is None else [valor, convertido]
+
+
+class ServicoConsultas:
+    """Consultas paginadas e filtradas às views, com pool e cache"""
+
+    def __init__(self, caminho_db=db_path, conexoes=CONEXOES, capacidade_cache=CAPACIDADE_CACHE):
+        # WAL é persistente no arquivo: leitores e cargas deixam de se bloquear.
+        # mode=rw: um caminho errado é erro, não um banco vazio novo
+        conn = sqlite3.connect(Path(caminho_db).resolve().as_uri() + '?mode=rw', uri=True)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.close()
+        self.pool = PoolConexoes(caminho_db, conexoes)
+        self.versao = VersaoDados(caminho_db)
+        self.cache = CacheLRU(capacidade_cache)
+        self._colunas = {}
+        self._afinidades = {}
+        self._versao_colunas = None
+
+    def colunas(self):
+        """{view: [colunas]} das views de VIEWS que existem no banco (relido se o banco mudar)"""
+        versao = self.versao.atual()
+        if versao != self._versao_colunas:
+            with self.pool.conexao() as conn:
+                existentes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'view'")}
+                info = {view: conn.execute(f'PRAGMA table_info({view})').fetchall()
+                        for view in VIEWS if view in existentes}
+            self._colunas = {view: [row[1] for row in linhas] for view, linhas in info.items()}
+            self._afinidades = {view: {row[1]: afinidade(row[2]) for row in linhas} for view, linhas in info.items()}
+            self._versao_colunas = versao
+        return self._colunas
+
+    def consultar(self, view, parametros):
+        """Uma página da view; levanta KeyError (view) ou ValueError (parâmetros)"""
+        colunas = self.colunas()[view]
+        afinidades = self._afinidades[view]
+        parametros = dict(parametros)
+        try:
+            limite = min(int(parametros.pop('limite', LIMITE_PADRAO)), LIMITE_MAXIMO)
+            pagina = int(parametros.pop('pagina', 1))
+        except ValueError:
+            raise ValueError('limite e pagina devem ser inteiros')
+        if limite < 1 or pagina < 1:
+            raise ValueError('limite e pagina devem ser positivos')
+        ordem = parametros.pop('ordem', None)
+        desconhecidas = set(parametros) - set(colunas)
+        if desconhecidas:
+            raise ValueError(f"Colunas inexistentes em {view}: {', '.join(sorted(desconhecidas))}")
+
+        condicoes, valores = [], []
+        for coluna, texto in sorted(parametros.items()):
+            itens = [item for v in texto.split(',') for item in valores_filtro(coluna, afinidades[coluna], v)]
+            condicoes.append(f'"{coluna}" IN ({",".join("?" * len(itens))})')
+            valores += itens
+        where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        order_by = ''
+        if ordem:
+            coluna = ordem.lstrip('-')
+            if coluna not in colunas:
+                raise ValueError(f'Coluna de ordem inexistente em {view}: {coluna}')
+            order_by = f' ORDER BY "{coluna}" {"DESC" if ordem.startswith("-") else "ASC"}'
+
+        versao = self.versao.atual()
+        chave = (view, where, tuple(valores), order_by, limite, pagina)
+        resultado = self.cache.obter(versao, chave)
+        if resultado is None:
+            with self.pool.conexao() as conn, etapa(f'consulta.{view}', perfil=False) as medida:
+                total = conn.execute(f'SELECT COUNT(*) FROM {view}{where}', valores).fetchone()[0]
+                cursor = conn.execute(f'SELECT * FROM {view}{where}{order_by} LIMIT ? OFFSET ?',
+                                      valores + [limite, (pagina - 1) * limite])
+                nomes = [d[0] for d in cursor.description]
+                linhas = [dict(zip(nomes, row)) for row in cursor]
+                medida['linhas'] = len(linhas)
+            resultado = {'view': view, 'total': total, 'pagina': pagina, 'limite': limite, 'linhas': linhas}
+            self.cache.guardar(versao, chave, resultado)
+        return dict(resultado, versao_dados=versao)
+
+    def fechar(self):
+        self.pool.fechar()
+        self.versao.conn.close()
+
+
+class Manipulador(BaseHTTPRequestHandler):
+    servico = None
+
+    def responder(self, status, conteudo):
+        corpo = json.dumps(conteudo, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        partes = [p for p in url.path.split('/') if p]
+        try:
+            if partes == ['saude']:
+                cache = self.servico.cache
+                self.responder(200, {'status': 'ok', 'versao_dados': self.servico.versao.atual(),
+                                     'cache': {'itens': len(cache.itens), 'acertos': cache.acertos,
+                                               'faltas': cache.faltas}})
+            elif partes == ['views']:
+                self.responder(200, self.servico.colunas())
+            elif len(partes) == 2 and partes[0] == 'views':
+                self.responder(200, self.servico.consultar(partes[1], parse_qsl(url.query)))
+            else:
+                self.responder(404, {'erro': f'Rota inexistente: {url.path}'})
+        except KeyError as e:
+            self.responder(404, {'erro': f'View indisponível: {e.args[0]}'})
+        except ValueError as e:
+            self.responder(400, {'erro': str(e)})
+        except sqlite3.Error as e:
+            self.responder(500, {'erro': str(e)})
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='API JSON somente leitura sobre as views de análise.')
+    parser.add_argument('--db', default=db_path, help='banco SQLite')
+    parser.add_argument('--host', default=HOST, help='endereço de escuta')
+    parser.add_argument('--porta', type=int, default=PORTA, help='porta HTTP')
+    parser.add_argument('--conexoes', type=int, default=CONEXOES, help='conexões de leitura no pool')
+    parser.add_argument('--cache', type=int, default=CAPACIDADE_CACHE, help='páginas no cache LRU')
+    args = parser.parse_args(argv)
+
+    try:
+        servico = ServicoConsultas(args.db, args.conexoes, args.cache)
+    except sqlite3.OperationalError as e:
+        parser.error(f'Não foi possível abrir o banco {args.db}: {e}')
+    Manipulador.servico = servico
+    servidor = ThreadingHTTPServer((args.host, args.porta), Manipulador)
+    print(f'Servindo {", ".join(servico.colunas())} em http://{args.host}:{args.porta}/views')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servico.fechar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Snapshot colunar (Parquet) das reviews para as análises.
+
+Grava a mesma base dos gráficos (Reviews + Aplicativos + categoria, ver
+dados_graficos.base_sqlite) em um dataset Parquet particionado por app
+(`app=<nome>/part-*.parquet`, estilo hive), com tipos compactos:
+- score e has_noise em int8, word_count/char_count em int32;
+- sentiment_label, model_sentiment e categoria com dicionário (int8 -> texto).
+
+A leitura do SQLite é feita em blocos (`fetchmany`) e cada bloco vira um
+RecordBatch, então a memória não depende do tamanho de Reviews. O dataset é
+escrito em uma pasta de staging que só substitui o snapshot anterior no final.
+
+Leitura: dados_graficos.ler_snapshot (memory-map + só as colunas pedidas).
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from dados_graficos import base_sqlite, snapshot_path
+from instrumentacao import medido
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+db_path = os.path.abspath(os.path.join(script_dir, '../banco_de_dados_sqlite/database.db'))
+
+TAMANHO_BLOCO = 100_000
+
+TEXTO_DICIONARIO = pa.dictionary(pa.int8(), pa.string())
+SCHEMA_SNAPSHOT = pa.schema([
+    ('id_review', pa.int64()),
+    ('app', pa.string()),
+    ('score', pa.int8()),
+    ('word_count', pa.int32()),
+    ('char_count', pa.int32()),
+    ('has_noise', pa.int8()),
+    ('sentiment_label', TEXTO_DICIONARIO),
+    ('model_sentiment', TEXTO_DICIONARIO),
+    ('categoria', TEXTO_DICIONARIO),
+])
+
+
+def lotes(caminho_db, tamanho_bloco):
+    """RecordBatches da base dos gráficos, bloco a bloco"""
+    # A conexão é aberta aqui: o write_dataset consome o gerador em outra thread
+    conn = sqlite3.connect(caminho_db)
+    cursor = conn.execute(f'SELECT {", ".join(SCHEMA_SNAPSHOT.names)} FROM ({base_sqlite(conn)})')
+    while True:
+        rows = cursor.fetchmany(tamanho_bloco)
+        if not rows:
+            break
+        colunas = list(zip(*rows))
+        arrays = []
+        for campo, valores in zip(SCHEMA_SNAPSHOT, colunas):
+            if pa.types.is_dictionary(campo.type):
+                arrays.append(pa.array(valores, pa.string()).dictionary_encode().cast(campo.type))
+            else:
+                arrays.append(pa.array(valores, campo.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=SCHEMA_SNAPSHOT)
+    conn.close()
+
+
+@medido('snapshot_parquet')
+def gerar_snapshot(caminho_db=db_path, destino=snapshot_path, tamanho_bloco=TAMANHO_BLOCO):
+    """Escreve o snapshot particionado por app; retorna o número de reviews"""
+    inicio = time.perf_counter()
+    total = 0
+
+    def contar(lotes_):
+        nonlocal total
+        for lote in lotes_:
+            total += lote.num_rows
+            yield lote
+
+    staging = destino + '_staging'
+    shutil.rmtree(staging, ignore_errors=True)
+    ds.write_dataset(
+        contar(lotes(caminho_db, tamanho_bloco)), staging, schema=SCHEMA_SNAPSHOT, format='parquet',
+        partitioning=['app'], partitioning_flavor='hive',
+        basename_template='part-{i}.parquet', max_rows_per_group=tamanho_bloco,
+    )
+
+    # Troca: o snapshot anterior só sai quando o novo está completo
+    shutil.rmtree(destino, ignore_errors=True)
+    os.rename(staging, destino)
+    print(f'{total} reviews no snapshot em {time.perf_counter() - inicio:.1f}s: {destino}')
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera o snapshot Parquet das reviews (particionado por app).')
+    parser.add_argument('--db', default=db_path, help='banco SQLite')
+    parser.add_argument('--destino', default=snapshot_path, help='pasta do dataset Parquet')
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help='linhas por bloco/row group')
+    args = parser.parse_args(argv)
+    gerar_snapshot(args.db, args.destino, args.tamanho_bloco)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../scripts')))
+
+from benchmark import preparar_banco  # noqa: E402
+from gerar_dados_sinteticos import escrever_csv, gerar_blocos  # noqa: E402
+
+
+@pytest.fixture
+def novo_banco(tmp_path):
+    """Cria bancos com schema.sql + melhorias_avaliacao.sql em tmp_path"""
+    def criar(nome='teste.db'):
+        caminho = str(tmp_path / nome)
+        preparar_banco(caminho)
+        return caminho
+    return criar
+
+
+@pytest.fixture
+def banco(novo_banco):
+    return novo_banco()
+
+
+@pytest.fixture
+def csv_sintetico(tmp_path):
+    """CSV com `linhas` reviews sintéticas (mesma semente do benchmark)"""
+    def gerar(linhas, nome='reviews.csv'):
+        caminho = str(tmp_path / nome)
+        escrever_csv(gerar_blocos(linhas, tamanho_bloco=max(1, linhas)), caminho)
+        return caminho
+    return gerar
+
+
+def consultar(caminho_db, sql, parametros=()):
+    conn = sqlite3.connect(caminho_db)
+    try:
+        return conn.execute(sql, parametros).fetchall()
+    finally:
+        conn.close()
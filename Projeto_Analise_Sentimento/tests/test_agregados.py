@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+from agregados import (instalar_agregados, reconstruir_agregados, reconstruir_resumo_app,
+                       reconstruir_resumo_categorias)
+from categorizacao import gravar_categorias
+from importar_csv_para_sqlite import importar
+
+# Apps ou categorias que perderam todas as reviews ficam com linha zerada nos
+# triggers e somem na reconstrução: os dois lados comparam só as não vazias
+SQL_RESUMO_APP = 'SELECT * FROM resumo_app WHERE total_reviews > 0 ORDER BY id_app'
+SQL_RESUMO_CATEGORIA = '''
+    SELECT id_app, id_categoria, total_reviews, soma_score, n_score
+    FROM resumo_app_categoria WHERE total_reviews > 0 ORDER BY id_app, id_categoria
+'''
+
+
+@pytest.fixture
+def conn(banco, csv_sintetico):
+    importar(csv_sintetico(300), banco, tamanho_bloco=100)
+    conn = sqlite3.connect(banco)
+    instalar_agregados(conn)
+    reconstruir_resumo_app(conn)
+    gravar_categorias(conn)
+    yield conn
+    conn.close()
+
+
+def mantido_e_reconstruido(conn, sql, reconstruir):
+    mantido = conn.execute(sql).fetchall()
+    reconstruir(conn)
+    return mantido, conn.execute(sql).fetchall()
+
+
+def alterar_reviews(conn):
+    with conn:
+        conn.execute("INSERT INTO Aplicativos (nome) VALUES ('Novo')")
+        conn.execute('''
+            INSERT INTO Reviews (review_uuid, score, id_app, char_count, word_count, has_noise,
+                                 sentiment_label, model_sentiment)
+            SELECT 'copia-' || review_uuid, score, id_app, char_count, word_count, has_noise,
+                   sentiment_label, 'positivo'
+            FROM Reviews WHERE id_review_sqlite % 7 = 0
+        ''')
+        conn.execute("INSERT INTO Reviews (review_uuid, score, id_app) "
+                     "SELECT 'so-nota', 5, id_app FROM Aplicativos WHERE nome = 'Novo'")
+        conn.execute('UPDATE Reviews SET score = NULL WHERE id_review_sqlite % 17 = 1')
+        conn.execute('UPDATE Reviews SET score = 5, word_count = NULL WHERE id_review_sqlite % 13 = 2')
+        conn.execute("UPDATE Reviews SET sentiment_label = 'negativo', has_noise = 1 "
+                     "WHERE id_review_sqlite % 11 = 5")
+        conn.execute("UPDATE Reviews SET id_app = (SELECT id_app FROM Aplicativos WHERE nome = 'Novo') "
+                     "WHERE id_review_sqlite % 11 = 3")
+        conn.execute('DELETE FROM Reviews WHERE id_review_sqlite % 9 = 4')
+
+
+def test_resumo_app_pelos_triggers_igual_a_reconstrucao(conn):
+    alterar_reviews(conn)
+    mantido, reconstruido = mantido_e_reconstruido(conn, SQL_RESUMO_APP, reconstruir_resumo_app)
+    assert mantido == reconstruido
+
+
+def test_resumo_app_categoria_pelos_triggers_igual_a_reconstrucao(conn):
+    alterar_reviews(conn)
+    with conn:
+        conn.execute('UPDATE Reviews_Categorias SET id_categoria = 1 WHERE id_review_sqlite % 5 = 0')
+        conn.execute('DELETE FROM Reviews_Categorias WHERE id_review_sqlite % 19 = 6')
+        conn.execute("INSERT INTO Reviews_Categorias (id_review_sqlite, id_categoria, confianca) "
+                     "SELECT id_review_sqlite, 2, 1.0 FROM Reviews WHERE review_uuid LIKE 'copia-%'")
+    # As reviews apagadas levam junto suas categorias
+    assert conn.execute('SELECT COUNT(*) FROM Reviews_Categorias WHERE id_review_sqlite NOT IN '
+                        '(SELECT id_review_sqlite FROM Reviews)').fetchone() == (0,)
+    mantido, reconstruido = mantido_e_reconstruido(conn, SQL_RESUMO_CATEGORIA, reconstruir_resumo_categorias)
+    assert mantido == reconstruido
+
+
+def test_carga_completa_recalcula_agregados(conn, banco, csv_sintetico):
+    importar(csv_sintetico(50, 'mais.csv'), banco, tamanho_bloco=20)
+    conn.execute('INSERT INTO Reviews_Categorias (id_review_sqlite, id_categoria, confianca) '
+                 'SELECT id_review_sqlite, 3, 1.0 FROM Reviews WHERE id_review_sqlite > 300')
+    conn.commit()
+    antes = conn.execute(SQL_RESUMO_APP).fetchall(), conn.execute(SQL_RESUMO_CATEGORIA).fetchall()
+    reconstruir_agregados(conn)
+    assert antes == (conn.execute(SQL_RESUMO_APP).fetchall(), conn.execute(SQL_RESUMO_CATEGORIA).fetchall())
+    assert conn.execute('SELECT SUM(total_reviews) FROM resumo_app').fetchone() == (350,)
@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+
+from etl_sqlite_to_mongodb import COLECAO_CONTROLE, conectar_mongo, executar_etl, sincronizar_incremental
+from importar_csv_para_sqlite import importar
+
+
+@pytest.fixture
+def cliente():
+    return conectar_mongo('mongomock://')
+
+
+def documentos(db, colecao):
+    return sorted(db[colecao].find(), key=lambda doc: doc['_id'])
+
+
+def versao(db):
+    return db[COLECAO_CONTROLE].find_one({'_id': 'reviews'})['versao']
+
+
+def test_sincronizacao_pelo_changelog_igual_a_carga_completa(banco, csv_sintetico, cliente):
+    importar(csv_sintetico(200), banco, tamanho_bloco=50)
+    destino = cliente['incremental']
+    # Primeira execução: carga completa, nada no changelog ainda
+    assert sincronizar_incremental(banco, destino, tamanho_lote=30, num_workers=2) == 0
+    assert destino['reviews'].count_documents({}) == 200
+
+    conn = sqlite3.connect(banco)
+    with conn:
+        conn.execute("INSERT INTO Aplicativos (nome) VALUES ('Novo')")
+        conn.execute('''
+            INSERT INTO Reviews (review_uuid, score, id_app, word_count, sentiment_label)
+            SELECT 'nova-' || id_review_sqlite, score, (SELECT id_app FROM Aplicativos WHERE nome = 'Novo'),
+                   word_count, sentiment_label
+            FROM Reviews WHERE id_review_sqlite % 10 = 0
+        ''')
+        conn.execute('UPDATE Reviews SET score = NULL WHERE id_review_sqlite % 13 = 1')
+        conn.execute("UPDATE Reviews SET sentiment_label = 'neutro' WHERE id_review_sqlite % 13 = 1")
+        conn.execute('DELETE FROM Reviews WHERE id_review_sqlite % 13 = 1 AND id_review_sqlite > 100')
+        conn.execute('DELETE FROM Reviews WHERE id_review_sqlite % 17 = 2')
+        conn.execute("UPDATE Reviews SET has_noise = 1 WHERE review_uuid LIKE 'nova-%'")
+    alteradas = conn.execute('SELECT COUNT(DISTINCT id_review_sqlite) FROM Reviews_Changelog').fetchone()[0]
+    conn.close()
+
+    versao_antes = versao(destino)
+    # Lotes pequenos: várias mudanças da mesma review caem em lotes diferentes
+    # (cada lote conta as suas)
+    assert sincronizar_incremental(banco, destino, tamanho_lote=7, num_workers=2) >= alteradas
+    assert versao(destino) == versao_antes + 1
+
+    completo = cliente['completo']
+    executar_etl(banco, completo, tamanho_lote=30, num_workers=2)
+    assert documentos(destino, 'reviews') == documentos(completo, 'reviews')
+    assert documentos(destino, 'aplicativos') == documentos(completo, 'aplicativos')
+
+    # Changelog consumido: uma nova execução não envia nada nem muda a versão
+    conn = sqlite3.connect(banco)
+    assert conn.execute('SELECT COUNT(*) FROM Reviews_Changelog').fetchone() == (0,)
+    conn.close()
+    assert sincronizar_incremental(banco, destino, tamanho_lote=7) == 0
+    assert versao(destino) == versao_antes + 1
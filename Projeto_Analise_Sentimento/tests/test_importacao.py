@@ -0,0 +1,126 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import importar_csv_para_sqlite as imp
+from conftest import consultar
+from etl_sqlite_to_mongodb import instalar_captura
+
+SQL_REVIEWS = '''
+    SELECT r.id_review_sqlite, r.review_uuid, r.score, a.nome, r.char_count, r.word_count,
+           r.has_noise, r.sentiment_label, r.model_sentiment
+    FROM Reviews r LEFT JOIN Aplicativos a USING (id_app)
+    ORDER BY r.id_review_sqlite
+'''
+
+
+def interromper_apos(blocos, monkeypatch):
+    """Faz a próxima importação cair depois de gravar `blocos` blocos"""
+    ler_blocos = imp.ler_blocos
+
+    def interrompido(*args, **kwargs):
+        for i, bloco in enumerate(ler_blocos(*args, **kwargs)):
+            if i == blocos:
+                raise KeyboardInterrupt
+            yield bloco
+
+    monkeypatch.setattr(imp, 'ler_blocos', interrompido)
+
+
+@pytest.mark.parametrize('pular', range(6))
+def test_ler_blocos_pula_registros_com_quebra_de_linha(tmp_path, pular):
+    caminho = tmp_path / 'quebras.csv'
+    caminho.write_text('reviewId,score,app,content\n'
+                       'a,1,X,"linha 1\nlinha 2"\n'
+                       'b,2,X,simples\n'
+                       'c,3,Y,"p\nq\nr"\n'
+                       'd,4,Y,fim\n', encoding='utf-8')
+    colunas = ['reviewId', 'score', 'app', 'content']
+    blocos = list(imp.ler_blocos(str(caminho), 2, pular=pular, colunas=colunas))
+    lidas = [valor for bloco in blocos for valor in bloco['reviewId']]
+    assert lidas == pd.read_csv(caminho)['reviewId'].tolist()[pular:]
+    assert all(len(bloco) for bloco in blocos)
+
+
+def test_retomada_continua_do_ultimo_bloco_confirmado(novo_banco, banco, csv_sintetico, monkeypatch):
+    csv = csv_sintetico(25)
+    interromper_apos(2, monkeypatch)
+    with pytest.raises(KeyboardInterrupt):
+        imp.importar(csv, banco, tamanho_bloco=10)
+    monkeypatch.undo()
+
+    conn = sqlite3.connect(banco)
+    assert imp.ler_checkpoint(conn, 'reviews.csv')[:2] == (20, False)
+    conn.close()
+    assert consultar(banco, 'SELECT COUNT(*) FROM Reviews') == [(20,)]
+
+    assert imp.importar(csv, banco, tamanho_bloco=10) == 5
+    conn = sqlite3.connect(banco)
+    assert imp.ler_checkpoint(conn, 'reviews.csv')[:2] == (25, True)
+    conn.close()
+
+    de_uma_vez = novo_banco('de_uma_vez.db')
+    imp.importar(csv, de_uma_vez, tamanho_bloco=10)
+    assert consultar(banco, SQL_REVIEWS) == consultar(de_uma_vez, SQL_REVIEWS)
+
+
+def test_importacao_concluida_recomeca_do_inicio(banco, csv_sintetico):
+    csv = csv_sintetico(12)
+    imp.importar(csv, banco, tamanho_bloco=5)
+    # Sem --incremental, uma nova carga do mesmo arquivo relê tudo
+    assert imp.importar(csv, banco, tamanho_bloco=5) == 12
+    assert consultar(banco, 'SELECT COUNT(*) FROM Reviews') == [(24,)]
+
+
+def test_incremental_ignora_iguais_atualiza_alteradas_e_insere_novas(banco, csv_sintetico):
+    csv = csv_sintetico(20)
+    imp.importar(csv, banco, tamanho_bloco=8, incremental=True)
+    ids = dict(consultar(banco, 'SELECT review_uuid, id_review_sqlite FROM Reviews'))
+    assert len(ids) == 20
+
+    conn = sqlite3.connect(banco)
+    instalar_captura(conn)
+    conn.close()
+
+    # Arquivo reescrito (não só estendido): relido do início, com upsert por review_uuid
+    df = pd.read_csv(csv)
+    df.loc[0, 'score'] = df.loc[0, 'score'] % 5 + 1
+    df.loc[1, 'sentiment_label'] = 'outro'
+    novas = df.head(3).assign(reviewId=['nova-1', 'nova-2', 'nova-3'])
+    pd.concat([df, novas]).to_csv(csv, index=False)
+    assert imp.importar(csv, banco, tamanho_bloco=8, incremental=True) == 23
+
+    assert consultar(banco, 'SELECT COUNT(*), COUNT(DISTINCT review_uuid) FROM Reviews') == [(23, 23)]
+    mudancas = consultar(banco, '''
+        SELECT r.review_uuid, c.operacao FROM Reviews_Changelog c
+        JOIN Reviews r USING (id_review_sqlite) ORDER BY c.seq
+    ''')
+    assert sorted(mudancas) == sorted([(df.loc[0, 'reviewId'], 'U'), (df.loc[1, 'reviewId'], 'U'),
+                                       ('nova-1', 'I'), ('nova-2', 'I'), ('nova-3', 'I')])
+    atuais = dict(consultar(banco, 'SELECT review_uuid, id_review_sqlite FROM Reviews'))
+    assert all(atuais[uuid] == id_ for uuid, id_ in ids.items())
+    assert consultar(banco, 'SELECT score FROM Reviews WHERE review_uuid = ?',
+                     (df.loc[0, 'reviewId'],)) == [(df.loc[0, 'score'],)]
+
+
+def test_incremental_le_so_o_que_foi_acrescentado(banco, csv_sintetico):
+    csv = csv_sintetico(10)
+    imp.importar(csv, banco, incremental=True)
+    df = pd.read_csv(csv)
+    df.head(2).assign(reviewId=['extra-1', 'extra-2']).to_csv(csv, mode='a', header=False, index=False)
+    # Marca d'água: só as duas linhas novas são lidas
+    assert imp.importar(csv, banco, incremental=True) == 2
+    assert consultar(banco, 'SELECT COUNT(*) FROM Reviews') == [(12,)]
+
+
+def test_incremental_sem_atualizar_mantem_existentes(banco, csv_sintetico):
+    csv = csv_sintetico(5)
+    imp.importar(csv, banco, incremental=True)
+    df = pd.read_csv(csv)
+    original = int(df.loc[2, 'score'])
+    df.loc[2, 'score'] = original % 5 + 1
+    df.to_csv(csv, index=False)
+    imp.importar(csv, banco, incremental=True, atualizar=False)
+    assert consultar(banco, 'SELECT score FROM Reviews WHERE review_uuid = ?',
+                     (df.loc[2, 'reviewId'],)) == [(original,)]